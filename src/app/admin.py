@@ -1,24 +1,208 @@
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+import json
+import time
+from typing import Any, Optional
+
+import anyio
 from sqladmin import ModelView
-from sqladmin.filters import AllUniqueStringValuesFilter
+from sqladmin.filters import AllUniqueStringValuesFilter, StaticValuesFilter
+from sqladmin.pagination import PageControl, Pagination
+from sqlalchemy import Select, false, tuple_
+from starlette.datastructures import URL
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
 
 from core.schemas import AddonSchema, DownloadsSchema
 
 
+class CachedUniqueStringValuesFilter(AllUniqueStringValuesFilter):
+    """`AllUniqueStringValuesFilter` that runs its `SELECT DISTINCT` at most once per `ttl` seconds."""
+
+    def __init__(self, *args, ttl: float = 3600, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ttl = ttl
+        self._lookups = None
+        self._expires_at = 0.0
+
+    async def lookups(self, request, model, run_query):
+        if self._lookups is None or time.monotonic() >= self._expires_at:
+            self._lookups = sorted(await super().lookups(request, model, run_query), key=lambda lookup: (lookup[0] != '', lookup[0]))
+            self._expires_at = time.monotonic() + self.ttl
+
+        return self._lookups
+
+
+class PeriodFilter(StaticValuesFilter):
+    PERIODS = {'1d': timedelta(days=1), '7d': timedelta(days=7), '30d': timedelta(days=30)}
+
+    def __init__(self, column, title: Optional[str] = None, parameter_name: Optional[str] = None):
+        values = [('1d', 'Last 24 hours'), ('7d', 'Last 7 days'), ('30d', 'Last 30 days')]
+        super().__init__(column, values, title or 'Period', parameter_name or 'period')
+
+    async def get_filtered_query(self, query: Select, value: Any, model: Any) -> Select:
+        if value not in self.PERIODS:
+            return query
+
+        return query.filter(self.column >= datetime.now(timezone.utc) - self.PERIODS[value])
+
+
+@dataclass
+class KeysetPagination(Pagination):
+    """Prev/next links carry the first/last row key instead of an offset, `count` is an estimate."""
+
+    first_key: Optional[str] = None
+    last_key: Optional[str] = None
+    has_more: bool = False
+
+    def __post_init__(self) -> None:
+        # the estimated count must not clamp the page the cursor points at
+        pass
+
+    @property
+    def has_previous(self) -> bool:
+        return self.page > 1
+
+    @property
+    def has_next(self) -> bool:
+        return self.has_more
+
+    def resize(self, page_size: int) -> Pagination:
+        # cursors are only honoured past the first page, so resizing starts over
+        return replace(self, page=1, page_size=page_size, page_controls=[])
+
+    def add_pagination_urls(self, base_url: URL) -> None:
+        base_url = base_url.remove_query_params(['after', 'before'])
+
+        if self.has_previous:
+            url = base_url.include_query_params(page=self.page - 1)
+            if self.page > 2:
+                url = url.include_query_params(before=self.first_key)
+            self.page_controls.append(PageControl(number=self.page - 1, url=str(url)))
+
+        self.page_controls.append(PageControl(number=self.page, url='#'))
+
+        if self.has_next:
+            url = base_url.include_query_params(page=self.page + 1, after=self.last_key)
+            self.page_controls.append(PageControl(number=self.page + 1, url=str(url)))
+
+
 class DownloadsAdmin(ModelView, model=DownloadsSchema):
     column_list = [DownloadsSchema.esoui_id, DownloadsSchema.downloads, DownloadsSchema.timestamp]
+    column_filters = [
+        PeriodFilter(DownloadsSchema.timestamp),
+    ]
+
     name = 'Download'
     icon = 'fa-solid fa-cloud-arrow-down'
+    column_searchable_list = [DownloadsSchema.esoui_id]
 
     can_create = False
     can_edit = False
     can_delete = False
     can_view_details = False
+    can_export = False
+
+    def search_placeholder(self) -> str:
+        return 'esoui_id (or pick a period)'
+
+    def search_query(self, stmt: Select, term: str) -> Select:
+        term = term.strip()
+        if not term.isdigit():
+            return stmt.filter(false())
+
+        return stmt.filter(DownloadsSchema.esoui_id == int(term))
+
+    @staticmethod
+    def _key(row: DownloadsSchema) -> str:
+        return json.dumps([row.esoui_id, row.timestamp.isoformat()])
+
+    @staticmethod
+    def _parse_key(value: str) -> tuple[int, datetime]:
+        esoui_id, timestamp = json.loads(value)
+        return int(esoui_id), datetime.fromisoformat(timestamp)
+
+    def _estimate_count_sync(self, stmt: Select) -> int:
+        # the planner's row estimate comes from pg_class/pg_statistic, no rows are read
+        with self.session_maker() as session:
+            connection = session.connection()
+            compiled = stmt.compile(connection)
+            plan = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params).scalar()
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    async def estimate_count(self, stmt: Select) -> int:
+        return await anyio.to_thread.run_sync(self._estimate_count_sync, stmt)
+
+    async def list(self, request: Request) -> Pagination:
+        page = self.validate_page_number(request.query_params.get('page'), 1)
+        page_size = self.validate_page_number(request.query_params.get('pageSize'), 0)
+        page_size = min(page_size or self.page_size, max(self.page_size_options))
+        search = request.query_params.get('search', None)
+
+        stmt = self.list_query(request)
+        filtered = False
+
+        for filter in self.get_filters():
+            if value := request.query_params.get(filter.parameter_name):
+                narrowed = await filter.get_filtered_query(stmt, value, self.model)
+                # filters hand the query back untouched for values they don't know, e.g. `?period=bogus`
+                filtered |= narrowed is not stmt
+                stmt = narrowed
+
+        if search:
+            stmt = self.search_query(stmt=stmt, term=search)
+            filtered = True
+
+        # an unfiltered listing would walk the whole table, show nothing until narrowed down
+        if not filtered:
+            return KeysetPagination(rows=[], page=1, page_size=page_size, count=0)
+
+        count = await self.estimate_count(stmt)
+
+        key = tuple_(DownloadsSchema.esoui_id, DownloadsSchema.timestamp)
+        after, before = request.query_params.get('after'), request.query_params.get('before')
+
+        try:
+            if page > 1 and before:
+                stmt = stmt.filter(key > tuple_(*self._parse_key(before)))
+                stmt = stmt.order_by(DownloadsSchema.esoui_id.asc(), DownloadsSchema.timestamp.asc())
+            elif page > 1 and after:
+                stmt = stmt.filter(key < tuple_(*self._parse_key(after)))
+                stmt = stmt.order_by(DownloadsSchema.esoui_id.desc(), DownloadsSchema.timestamp.desc())
+            else:
+                page = 1
+                stmt = stmt.order_by(DownloadsSchema.esoui_id.desc(), DownloadsSchema.timestamp.desc())
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail='Invalid page cursor')
+
+        rows = list(await self._run_query(stmt.limit(page_size + 1)))
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if page > 1 and before:
+            rows.reverse()
+            # walking backwards, the page we came from is always next
+            has_more = True
+
+        return KeysetPagination(
+            rows=rows,
+            page=page,
+            page_size=page_size,
+            count=max(count, (page - 1) * page_size + len(rows) + has_more),
+            first_key=self._key(rows[0]) if rows else None,
+            last_key=self._key(rows[-1]) if rows else None,
+            has_more=has_more,
+        )
 
 
 class AddonAdmin(ModelView, model=AddonSchema):
     column_list = [AddonSchema.esoui_id, AddonSchema.title, AddonSchema.author, AddonSchema.category, AddonSchema.url]
     column_filters = [
-        AllUniqueStringValuesFilter(AddonSchema.category),
+        CachedUniqueStringValuesFilter(AddonSchema.category),
     ]
 
     name = 'Addon'
@@ -0,0 +1,81 @@
+"""Fingerprinted, precompressed copies of `app/static`.
+
+Every file is copied to `ASSETS_PATH` under a name that includes a hash of
+its content, next to `.gz`/`.br` variants. A changed file gets a new name, so
+assets are served as immutable and templates link them through `asset()`.
+Built by every worker on startup, or ahead of time with `python -m app.assets`.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from core.payloads import write_atomic, write_variants
+
+
+STATIC_PATH = Path(__file__).parent / 'static'
+ASSETS_PATH = Path(os.getenv('ASSETS_PATH', Path(__file__).parent.parent / 'output' / 'assets'))
+
+ASSETS_URL = '/assets'
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# source name (`css/style.css`) -> fingerprinted name (`css/style.3f2a9c1d0b7e.css`)
+MANIFEST: dict[str, str] = {}
+
+
+def fingerprinted_name(name: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, dot, suffix = name.rpartition('.')
+    return f'{stem}.{digest}.{suffix}' if dot else f'{name}.{digest}'
+
+
+def build_assets(static_path: Path = STATIC_PATH, assets_path: Path = ASSETS_PATH) -> dict[str, str]:
+    manifest = {}
+    for source in sorted(static_path.rglob('*')):
+        if not source.is_file():
+            continue
+
+        name = source.relative_to(static_path).as_posix()
+        content = source.read_bytes()
+        manifest[name] = fingerprinted_name(name, content)
+
+        # older versions are kept, pages cached by browsers may still link them
+        target = assets_path / manifest[name]
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            write_variants(target, content, only_smaller=True)
+
+    assets_path.mkdir(parents=True, exist_ok=True)
+    write_atomic(assets_path / 'manifest.json', json.dumps(manifest, indent=2).encode())
+
+    MANIFEST.clear()
+    MANIFEST.update(manifest)
+
+    return manifest
+
+
+def asset(name: str) -> str:
+    """URL of a static file, the plain `/static` one until assets are built."""
+    if name in MANIFEST:
+        return f'{ASSETS_URL}/{MANIFEST[name]}'
+
+    return f'/static/{name}'
+
+
+def find_asset(path: str) -> Path | None:
+    root = ASSETS_PATH.resolve()
+    target = (ASSETS_PATH / path).resolve()
+    if not target.is_relative_to(root) or not target.is_file():
+        return None
+
+    # the manifest changes on every build and temp files are half written,
+    # neither may be served as immutable
+    if target == root / 'manifest.json' or target.name.startswith('.'):
+        return None
+
+    return target
+
+
+if __name__ == '__main__':
+    for name, fingerprinted in build_assets().items():
+        print(f'{name} -> {fingerprinted}')
@@ -1,4 +1,12 @@
 from contextlib import asynccontextmanager
+from datetime import datetime
+import logging
+import mimetypes
+import os
+import time
+
+# startup is measured from here, the stdlib imports above are negligible
+STARTED_AT = time.perf_counter()
 
 from pathlib import Path
 
@@ -6,39 +14,158 @@ from fastapi import FastAPI, Query, Request, Depends, HTTPException
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
-
-from sqladmin import Admin
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, generate_latest
+from starlette.applications import Starlette
 
+from app.assets import ASSET_CACHE_CONTROL, ASSETS_URL, asset, build_assets, find_asset
 from app.services.addons import AddonsService, get_addons_service
-from core.database import create_tables, ENGINE
+from app.services.catalog import CATALOG
+from core.charts import SPEED_RESOLUTION
+from core.database import ensure_schema, get_db_cm, get_engine, warm_pool
+from core.metrics import SLOW_STATEMENTS, TextfileCollector
+from core.payloads import PAYLOAD_CACHE_CONTROL, find_payload, find_variant, read_payload
 
-from app.admin import DownloadsAdmin, AddonAdmin
-from app.models import AddonDownloadSpeedResponse, AddonResponse, DownloadResponse, Filters, ReleaseResponse
+from app.models import AddonDownloadSpeedResponse, AddonMetricsResponse, AddonResponse, CompareResponse, DownloadResponse, Filters, ReleaseResponse
+from core.resampling import Resolution
 
 
 BASE_FOLDER = Path(__file__).parent
 
+ADMIN_ENABLED = os.getenv('ADMIN_ENABLED', 'true').lower() not in ('0', 'false', 'no')
 
-app = FastAPI(title='ESOUI Charts')
+MAX_COMPARE_ADDONS = 100
 
-app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Time spent handling HTTP requests',
+    ['method', 'route', 'status'],
+)
+STARTUP_DURATION = Gauge('app_startup_seconds', 'Time spent in each startup phase of this worker', ['phase'])
 
-app.mount('/static', StaticFiles(directory=BASE_FOLDER / 'static'), name='static')
-templates = Jinja2Templates(directory=BASE_FOLDER / 'templates')
+REGISTRY.register(TextfileCollector())
 
+logger = logging.getLogger('uvicorn.error')
 
-admin = Admin(app, ENGINE)
 
-admin.add_view(AddonAdmin)
-admin.add_view(DownloadsAdmin)
+def warm_catalog():
+    with get_db_cm() as db:
+        CATALOG.refresh(db, force=True)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_tables()
+    STARTUP_DURATION.labels(phase='import').set(IMPORTED_AT - STARTED_AT)
+
+    # everything a first request would otherwise pay for
+    for phase, warm_up in (
+        ('assets', build_assets),
+        ('schema', ensure_schema),
+        ('pool', warm_pool),
+        ('catalog', warm_catalog),
+    ):
+        start = time.perf_counter()
+        warm_up()
+        STARTUP_DURATION.labels(phase=phase).set(time.perf_counter() - start)
+
+    logger.info(f'Ready in {time.perf_counter() - STARTED_AT:.2f}s ({IMPORTED_AT - STARTED_AT:.2f}s imports, {len(CATALOG.addons)} addons cached)')
+
     yield
 
+    get_engine().dispose()
+
+
+class LazyAdmin:
+    """ASGI app that builds the sqladmin interface on its first request, keeping sqladmin out of startup."""
+
+    def __init__(self):
+        self._app = None
+
+    def _build(self) -> Starlette:
+        if self._app is None:
+            from sqladmin import Admin
+
+            from app.admin import AddonAdmin, DownloadsAdmin
+
+            # Admin mounts itself on the app it is given, only its inner app is served
+            admin = Admin(Starlette(), get_engine())
+            admin.add_view(AddonAdmin)
+            admin.add_view(DownloadsAdmin)
+
+            self._app = admin.admin
+
+        return self._app
+
+    @property
+    def routes(self):
+        # url_for('admin:...') walks these, and is only called from admin pages
+        return self._app.routes if self._app is not None else []
+
+    async def __call__(self, scope, receive, send):
+        await self._build()(scope, receive, send)
+
+
+app = FastAPI(title='ESOUI Charts', lifespan=lifespan)
+
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+
+
+@app.middleware('http')
+async def measure_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # route templates keep the label set small, unlike raw paths; routes of
+        # mounted apps are relative to the mount, whose path ends up in root_path
+        route = request.scope.get('route')
+        root_path = request.scope.get('root_path', '')
+        mount_path = root_path.removeprefix(request.scope.get('app_root_path', root_path))
+        REQUEST_DURATION.labels(
+            method=request.method,
+            # mounted apps without routes of their own, like StaticFiles, get the mount path
+            route=mount_path + route.path if route else mount_path or 'unmatched',
+            status=status,
+        ).observe(time.perf_counter() - start)
+
+app.mount('/static', StaticFiles(directory=BASE_FOLDER / 'static'), name='static')
+templates = Jinja2Templates(directory=BASE_FOLDER / 'templates')
+templates.env.globals['asset'] = asset
+
+if ADMIN_ENABLED:
+    app.mount('/admin', LazyAdmin(), name='admin')
+
+
+def payload_response(request: Request, kind: str, key: int | str) -> FileResponse | None:
+    found = find_payload(kind, key, request.headers.get('accept-encoding', ''))
+    if not found:
+        return None
+
+    path, encoding = found
+    headers = {'Cache-Control': PAYLOAD_CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    return FileResponse(path, media_type='application/json', headers=headers)
+
+
+@app.get(ASSETS_URL + '/{path:path}', include_in_schema=False)
+async def assets(request: Request, path: str):
+    found = find_asset(path)
+    if not found:
+        raise HTTPException(status_code=404)
+
+    # precompressed variants carry Content-Encoding, which GZipMiddleware leaves alone
+    variant, encoding = find_variant(found, request.headers.get('accept-encoding', ''))
+    headers = {'Cache-Control': ASSET_CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    return FileResponse(variant, media_type=mimetypes.guess_type(found.name)[0], headers=headers)
+
 
 @app.get('/')
 async def search_page(
@@ -85,7 +212,12 @@ async def author(
         deprecated=deprecated,
     )
 
-    downloads = addons_service.get_downloads(filters)
+    downloads = None
+    if not deprecated:
+        downloads = read_payload('author', author)
+    if downloads is None:
+        downloads = addons_service.get_downloads(filters)
+
     for download in downloads:
         download['max'] = format_number(download['y'][-1])
 
@@ -105,9 +237,9 @@ async def addon_page(
     addons_service: AddonsService = Depends(get_addons_service),
 ):  
     filters = Filters(addons=[esoui_id])
-    downloads = addons_service.get_downloads(filters)
+    downloads = read_payload('addon', esoui_id) or addons_service.get_downloads(filters)
     releases = addons_service.get_releases(esoui_id)
-    download_speed = addons_service.get_download_speed(esoui_id)
+    download_speed = read_payload('speed', esoui_id) or addons_service.get_download_speed(esoui_id)
     
     return templates.TemplateResponse(
         request=request,
@@ -124,25 +256,86 @@ async def addon_page(
 @app.get('/api/downloads', response_model=list[DownloadResponse])
 async def api_downloads(
     addons: list[int] = Query(None),
+    resolution: Resolution = Query(None),
     addons_service: AddonsService = Depends(get_addons_service),
 ):
-    return addons_service.get_downloads(Filters(addons=addons))
+    return addons_service.get_downloads(Filters(addons=addons, resolution=resolution))
 
 
 @app.get('/api/author/{author:str}', response_model=list[DownloadResponse])
 async def api_author_downloads(
+    request: Request,
     author: str,
+    resolution: Resolution = Query(None),
     addons_service: AddonsService = Depends(get_addons_service),
 ):
-    return addons_service.get_downloads(Filters(author=author))
+    if not resolution and (response := payload_response(request, 'author', author)):
+        return response
+
+    return addons_service.get_downloads(Filters(author=author, resolution=resolution))
 
 
 @app.get('/api/addon/{esoui_id:int}', response_model=list[DownloadResponse])
 async def api_addon_downloads(
+    request: Request,
     esoui_id: int,
+    resolution: Resolution = Query(None),
     addons_service: AddonsService = Depends(get_addons_service),
 ):
-    return addons_service.get_downloads(Filters(addons=[esoui_id]))
+    if not resolution and (response := payload_response(request, 'addon', esoui_id)):
+        return response
+
+    return addons_service.get_downloads(Filters(addons=[esoui_id], resolution=resolution))
+
+
+@app.get('/api/addon/{esoui_id:int}/speed', response_model=AddonDownloadSpeedResponse)
+async def api_addon_download_speed(
+    request: Request,
+    esoui_id: int,
+    resolution: Resolution = Query(SPEED_RESOLUTION),
+    addons_service: AddonsService = Depends(get_addons_service),
+):
+    if resolution == SPEED_RESOLUTION and (response := payload_response(request, 'speed', esoui_id)):
+        return response
+
+    return addons_service.get_download_speed(esoui_id, resolution)
+
+
+@app.get('/api/addon/{esoui_id:int}/metrics', response_model=AddonMetricsResponse)
+async def api_addon_metrics(
+    request: Request,
+    esoui_id: int,
+    addons_service: AddonsService = Depends(get_addons_service),
+):
+    if response := payload_response(request, 'metrics', esoui_id):
+        return response
+
+    return addons_service.get_metrics(esoui_id)
+
+
+# a plain `def` runs in the threadpool, a large comparison doesn't block the event loop
+@app.get('/api/compare', response_model=CompareResponse)
+def api_compare(
+    addons: list[int] = Query(...),
+    resolution: Resolution = Query('1h'),
+    since: datetime = Query(None),
+    addons_service: AddonsService = Depends(get_addons_service),
+):
+    if len(addons) > MAX_COMPARE_ADDONS:
+        raise HTTPException(status_code=422, detail=f'At most {MAX_COMPARE_ADDONS} addons can be compared at once')
+
+    # lists are already JSON-ready, skip re-validating a few million values
+    return JSONResponse(addons_service.compare(addons, resolution, since))
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get('/metrics/statements', include_in_schema=False)
+async def metrics_statements():
+    return SLOW_STATEMENTS.report()
 
 
 # @app.get('/api/addons', response_model=list[AddonResponse])
@@ -161,6 +354,9 @@ async def api_addons(
     return addons_service.search_for(q)
 
 
+IMPORTED_AT = time.perf_counter()
+
+
 if __name__ == '__main__':
     import uvicorn
     uvicorn.run(app, host='0.0.0.0', port=8000)
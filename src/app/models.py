@@ -2,13 +2,8 @@ from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 
-
-class DownloadResponse(BaseModel):
-    name: str
-    x: list[datetime]
-    y: list[int]
-    author: Optional[str] = None
-    max: Optional[int] = None
+from core.charts import AddonDownloadSpeedResponse, AddonMetricsResponse, DownloadResponse, Filters, MetricResponse
+from core.resampling import Resolution
 
 
 class ReleaseResponse(BaseModel):
@@ -25,12 +20,17 @@ class AddonResponse(BaseModel):
     # favorites: int   
 
 
-class AddonDownloadSpeedResponse(BaseModel):
-    x: list[datetime]
-    y: list[float]
+class CompareSeriesResponse(BaseModel):
+    esoui_id: int
+    name: str
+    downloads: list[Optional[int]]
+    speed: list[Optional[float]]
+    share: list[Optional[float]]
+    rank: list[Optional[int]]
 
 
-class Filters(BaseModel):
-    addons: Optional[list[int]] = None
-    author: Optional[str] = None
-    deprecated: Optional[bool] = False
+class CompareResponse(BaseModel):
+    x: list[datetime]
+    # coarser than requested when the range would have too many points
+    resolution: Resolution
+    addons: list[CompareSeriesResponse]
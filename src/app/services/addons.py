@@ -1,69 +1,29 @@
-from collections import defaultdict
 from collections.abc import Sequence
 from datetime import datetime, timedelta, timezone
 
 from fastapi import Depends
-from sqlalchemy import Row, func, literal_column, or_, select
+import numpy as np
+from sqlalchemy import Row, func, literal, select
 from sqlalchemy.orm import Session
 
+from core import resampling
+from core.charts import ChartsService
 from core.database import get_db
+from core.queries import per_addon
 from core.schemas import AddonSchema, DownloadsSchema, UpdateSchema
 
-from app.models import AddonDownloadSpeedResponse, DownloadResponse, Filters, ReleaseResponse
+from app.models import ReleaseResponse
+from app.services.catalog import CATALOG
 
 
-class AddonsService:
-    def __init__(self, db: Session):
-        self.db = db
+BUCKET_ORIGIN = datetime(1970, 1, 1)
 
-    def _get_addons_downloads(self, filters: Filters) -> Sequence[Row]:
-        get_addons = (
-            select(
-                DownloadsSchema.esoui_id,
-                DownloadsSchema.timestamp,
-                DownloadsSchema.downloads,
-                AddonSchema.title,
-            )
-            .join(AddonSchema)
-            .order_by(DownloadsSchema.timestamp)
-        )
-
-        # if not filters.addons and not filters.author:
-        #     filters = Filters(
-        #         addons=[4035, 4141, 4108, 4037, 4112, 4032, 4082]
-        #     )
-
-        if addons := filters.addons:
-            get_addons = get_addons.where(DownloadsSchema.esoui_id.in_(addons))
+# longer ranges are compared at a coarser resolution, 50 addons over a year
+# at `1h` is several million values to compute, serialize and compress
+MAX_COMPARE_POINTS = 2000
 
-        if author := filters.author:
-            get_addons = get_addons.add_columns(AddonSchema.author).where(AddonSchema.author == author)
-
-        if not filters.deprecated:
-            get_addons = get_addons.where(AddonSchema.category != 157)
-
-        return self.db.execute(get_addons).all()
-
-    def get_downloads(self, filters: Filters) -> list[dict]:
-        addons = self._get_addons_downloads(filters)  
-
-        plotly_data = defaultdict(lambda: {'x': [], 'y': [], 'name': None})
-
-        for addon in addons:  # TODO: fix very bad naming
-            addon_id = addon.esoui_id
-            plotly_data[addon_id]['name'] = f'{addon.title:.20} ({addon_id})'
-            plotly_data[addon_id]['x'].append(addon.timestamp)
-            plotly_data[addon_id]['y'].append(addon.downloads)
-            
-            # if author:
-            #     plotly_data[addon_id]['author'] = result.author
-
-        responce = []
-        for data in plotly_data.values():
-            responce.append(DownloadResponse(**data).model_dump(mode='json'))
-
-        return responce
 
+class AddonsService(ChartsService):
     def get_last_month_downloads(self) -> Sequence[Row]:
         subq = (
             select(
@@ -123,78 +83,113 @@ class AddonsService:
 
         return responce
 
-    def get_download_speed(self, addon_id: int) -> dict:
-        ordered_downloads = (
-            select(
-                DownloadsSchema.timestamp,
-                DownloadsSchema.downloads,
-                func.lag(DownloadsSchema.timestamp, 1).over(order_by=DownloadsSchema.timestamp).label('prev_timestamp'),
-                func.lag(DownloadsSchema.downloads, 1).over(order_by=DownloadsSchema.downloads).label('prev_downloads'),
-            )
-            .where(DownloadsSchema.esoui_id == addon_id)
-            .cte('ordered_downloads')
-        )
-
-        speeds = (
-            select(
-                ordered_downloads.c.timestamp,
-                # ordered_downloads.c.downloads,
-                # literal_column('EXTRACT(EPOCH FROM (timestamp - prev_timestamp))').label('delta_time_seconds'),
-                (ordered_downloads.c.downloads - ordered_downloads.c.prev_downloads).label('delta_downloads'),
-                ((
-                    (ordered_downloads.c.downloads - ordered_downloads.c.prev_downloads) / 
-                    func.nullif(literal_column('EXTRACT(EPOCH FROM (timestamp - prev_timestamp))'), 0)
-                ) * 3600).label('downloads_per_hour'),
-            )
-            .select_from(ordered_downloads)
-            .offset(1)
-            .subquery()
+    def _get_bucketed_downloads(
+        self,
+        addons: list[int],
+        resolution: resampling.Resolution,
+        since: datetime | None = None,
+    ) -> Sequence[Row]:
+        # first snapshot of every grid bucket is enough to interpolate the
+        # cumulative counter onto that grid, so coarse resolutions fetch
+        # one row per bucket instead of one per snapshot
+        bucket = func.date_bin(
+            literal(resampling.RESOLUTIONS[resolution]),
+            DownloadsSchema.timestamp,
+            literal(BUCKET_ORIGIN),
         )
 
         query = (
             select(
-                speeds.c.timestamp,
-                
-                func.avg(speeds.c.downloads_per_hour)
-                .over(
-                    order_by=speeds.c.timestamp,
-                    rows=(-2, 2),
-                )
-                .label('downloads_per_hour')
+                DownloadsSchema.esoui_id,
+                DownloadsSchema.timestamp,
+                DownloadsSchema.downloads,
             )
+            .distinct(DownloadsSchema.esoui_id, bucket)
+            .where(DownloadsSchema.esoui_id.in_(addons))
+            .order_by(DownloadsSchema.esoui_id, bucket, DownloadsSchema.timestamp)
         )
 
-        results = self.db.execute(query).mappings().all()
-        
-        data = {'x': [], 'y': []}
-
-        for result in results:
-            if result.downloads_per_hour is None:  # TODO: make check in db
-                continue
-
-            data['x'].append(result.timestamp)
-            data['y'].append(result.downloads_per_hour)
-
-        return AddonDownloadSpeedResponse.model_validate(data).model_dump(mode='json')
-
-    def search_for(self, q: str) -> Sequence[Row]:
-        query = select(
-            AddonSchema.esoui_id,
-            AddonSchema.title,
-            AddonSchema.author,
-            AddonSchema.category,
+        if since:
+            query = query.where(DownloadsSchema.timestamp >= since)
+
+        return self.db.execute(query).all()
+
+    def _compare_resolution(
+        self,
+        addons: list[int],
+        resolution: resampling.Resolution,
+        since: datetime | None = None,
+    ) -> resampling.Resolution:
+        """`resolution`, or the first coarser one that keeps the grid under `MAX_COMPARE_POINTS`."""
+        if since is None:
+            first = per_addon(DownloadsSchema.timestamp, earliest=True)
+            get_first = select(func.min(first)).where(AddonSchema.esoui_id.in_(addons))
+            since = self.db.execute(get_first).scalar()
+
+        if since is None:
+            return resolution
+
+        span = datetime.now(timezone.utc).replace(tzinfo=None) - since.replace(tzinfo=None)
+        resolutions = list(resampling.RESOLUTIONS)
+        for candidate in resolutions[resolutions.index(resolution):]:
+            if span / resampling.RESOLUTIONS[candidate] <= MAX_COMPARE_POINTS:
+                return candidate
+
+        return resolutions[-1]
+
+    def compare(
+        self,
+        addons: list[int],
+        resolution: resampling.Resolution,
+        since: datetime | None = None,
+    ) -> dict:
+        get_titles = (
+            select(AddonSchema.esoui_id, AddonSchema.title)
+            .where(AddonSchema.esoui_id.in_(addons))
         )
-
-        try:
-            esoui_id = int(q)
-            query = query.where(AddonSchema.esoui_id == esoui_id)
-        except ValueError:
-            query = query.where(or_(
-                AddonSchema.title.ilike(f'%{q}%'),
-                AddonSchema.author.ilike(f'%{q}%'),
-            ))
-
-        return self.db.execute(query).all() 
+        titles = dict(self.db.execute(get_titles).all())
+        resolution = self._compare_resolution(list(titles), resolution, since)
+
+        rows = self._get_bucketed_downloads(list(titles), resolution, since)
+        if rows:
+            ids, timestamps, downloads = (np.asarray(column) for column in zip(*rows))
+        else:
+            ids, timestamps, downloads = np.empty(0, dtype=np.int64), np.empty(0, dtype='datetime64[ns]'), np.empty(0)
+
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(ids)]
+
+        series = {esoui_id: ((), ()) for esoui_id in titles}
+        for start, end in zip(starts, ends):
+            series[int(ids[start])] = (timestamps[start:end], downloads[start:end])
+
+        step = resampling.RESOLUTIONS[resolution]
+        aligned = resampling.align(series, resolution, max_gap=step + resampling.MAX_GAP)
+
+        speed = resampling.rate(aligned).y
+        speed = np.concatenate([np.full((len(aligned.keys), min(1, len(aligned.x))), np.nan), speed], axis=1)
+        share = resampling.share(aligned)
+        rank = resampling.rank(aligned)
+
+        return {
+            'x': np.datetime_as_string(aligned.x, unit='s').tolist(),
+            'resolution': resolution,
+            'addons': [
+                {
+                    'esoui_id': esoui_id,
+                    'name': f'{titles[esoui_id]:.20} ({esoui_id})',
+                    'downloads': resampling.to_list(aligned.y[i], aligned.gap[i], as_int=True),
+                    'speed': resampling.to_list(speed[i], decimals=2),
+                    'share': resampling.to_list(share[i], aligned.gap[i], decimals=4),
+                    'rank': resampling.to_list(rank[i], as_int=True),
+                }
+                for i, esoui_id in enumerate(aligned.keys)
+            ],
+        }
+
+    def search_for(self, q: str) -> list[dict]:
+        CATALOG.refresh(self.db)
+        return CATALOG.search(q)
 
 
 def get_addons_service(db: Session = Depends(get_db)) -> AddonsService:
@@ -0,0 +1,71 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from core.queries import per_addon
+from core.schemas import AddonSchema, DownloadsSchema
+
+
+# seconds between checks for a new snapshot
+CATALOG_TTL = 60
+
+
+def get_latest_snapshot(db: Session) -> datetime | None:
+    latest = per_addon(DownloadsSchema.timestamp)
+    return db.execute(select(func.max(latest)).select_from(AddonSchema)).scalar()
+
+
+@dataclass
+class AddonCatalog:
+    """Every addon's id, title, author and category, reloaded only when a new snapshot lands."""
+
+    ttl: float = CATALOG_TTL
+    addons: list[dict] = field(default_factory=list)
+    latest_snapshot: datetime | None = None
+    checked_at: float | None = None
+
+    _haystack: list[tuple[str, str]] = field(default_factory=list)
+
+    def refresh(self, db: Session, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and self.checked_at is not None and now - self.checked_at < self.ttl:
+            return False
+
+        self.checked_at = now
+        latest_snapshot = get_latest_snapshot(db)
+        if not force and self.addons and latest_snapshot == self.latest_snapshot:
+            return False
+
+        get_addons = (
+            select(
+                AddonSchema.esoui_id,
+                AddonSchema.title,
+                AddonSchema.author,
+                AddonSchema.category,
+            )
+            .order_by(AddonSchema.esoui_id)
+        )
+        addons = [row._asdict() for row in db.execute(get_addons).all()]
+
+        self.addons = addons
+        self._haystack = [(addon['title'].lower(), addon['author'].lower()) for addon in addons]
+        self.latest_snapshot = latest_snapshot
+
+        return True
+
+    def search(self, q: str) -> list[dict]:
+        try:
+            esoui_id = int(q)
+            return [addon for addon in self.addons if addon['esoui_id'] == esoui_id]
+        except ValueError:
+            q = q.lower()
+            return [
+                addon for addon, (title, author) in zip(self.addons, self._haystack)
+                if q in title or q in author
+            ]
+
+
+CATALOG = AddonCatalog()
@@ -0,0 +1,367 @@
+"""Benchmarks for the data pipeline and the website hot paths.
+
+Needs a scratch PostgreSQL database (ADDONS_* variables, same as the app); it
+is filled with synthetic data and must be empty. Run from `src/`:
+
+    python -m benchmarks.run run --addons 3000 --snapshots 1440
+    python -m benchmarks.run compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+from datetime import datetime, timezone
+import io
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+RESULTS_PATH = Path(__file__).parent / 'results'
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'data_pipeline'))
+
+
+def measure(fn, repeat: int = 1) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    return samples
+
+
+def summarize(samples: list[float]) -> dict:
+    ms = np.asarray(samples) * 1000
+
+    return {
+        'n': len(ms),
+        'mean_ms': float(ms.mean()),
+        'min_ms': float(ms.min()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def git_revision() -> dict:
+    def git(*args):
+        return subprocess.run(['git', *args], capture_output=True, text=True, cwd=Path(__file__).parent).stdout.strip()
+
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain'))}
+
+
+def bench_snapshot(dataset, first_snapshot: int, repeat: int, work_path: Path) -> dict[str, list[float]]:
+    from prefect import flow
+
+    import main as pipeline
+
+    @flow
+    def snapshot_stages(records: list[dict]) -> dict[str, float]:
+        timings = {}
+
+        def timed(name, fn, *args):
+            start = time.perf_counter()
+            result = fn(*args)
+            timings[name] = time.perf_counter() - start
+            return result
+
+        def archive():
+            parquet_path = work_path / 'snapshot.parquet'
+            df = pd.DataFrame(records)
+            del df['donationUrl']
+            df.to_parquet(parquet_path, index=False)
+            pipeline.compress_with_xz.fn(parquet_path).unlink()
+
+        timed('archive', archive)
+        addons = timed('validate', pipeline.validate.fn, records)
+        changed = timed('find_changed_addons', pipeline.find_changed_addons.fn, addons)
+        stale = timed('find_stale_payloads', pipeline.find_stale_payloads.fn, addons, changed)
+        timed('update_addons_info', pipeline.update_addons_info.fn, addons)
+        timed('extract_downloads', pipeline.extract_downloads.fn, addons)
+        timed('extract_latest_update', pipeline.extract_latest_update.fn, addons)
+        new_favorites = timed('extract_favorites', pipeline.extract_favorites.fn, addons)
+        new_downloads_monthly = timed('extract_monthly_downloads', pipeline.extract_monthly_downloads.fn, addons)
+        timed('render_payloads', pipeline.render_payloads.fn, changed + stale)
+        timed('render_metrics_payloads', pipeline.render_metrics_payloads.fn, addons, new_favorites + new_downloads_monthly)
+
+        return timings
+
+    samples = {}
+    for i in range(repeat):
+        for name, seconds in snapshot_stages(dataset.records(first_snapshot + i)).items():
+            samples.setdefault(f'snapshot.{name}', []).append(seconds)
+
+    return samples
+
+
+def bench_archive(files: list[Path], work_path: Path) -> dict[str, list[float]]:
+    from prefect import flow
+
+    import archive
+    from extractors import EXTRACTORS, create_extractors
+    import main as pipeline
+
+    @flow
+    def archive_stages(files: list[Path]) -> dict[str, list[float]]:
+        samples = {}
+        extractors = create_extractors(list(EXTRACTORS))
+
+        def timed(name, fn, *args):
+            start = time.perf_counter()
+            result = fn(*args)
+            samples.setdefault(f'extract_data_from_archive.{name}', []).append(time.perf_counter() - start)
+            return result
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for path in files:
+                parquet_path = timed('decompress_with_xz', pipeline.decompress_with_xz.fn, path, Path(temp_dir))
+                records = timed('load_parquet', pipeline.load_parquet.fn, parquet_path)
+                addons = timed('validate', pipeline.validate.fn, records)
+                parquet_path.unlink()
+
+                timestamp = archive.snapshot_timestamp(path).replace(tzinfo=None)
+                for extractor in extractors:
+                    timed(f'extract.{extractor.name}', extractor.add, addons, timestamp)
+
+        timed('write_extracted', pipeline.write_extracted.fn, extractors)
+
+        return samples
+
+    samples = archive_stages(files)
+
+    cache_path = work_path / 'cache'
+    samples['archive.sync_cache'] = measure(lambda: archive.sync_cache(files[0].parent, cache_path))
+    samples['archive.history'] = measure(lambda: archive.history('favorites', cache_path=cache_path), 5)
+
+    return samples
+
+
+def bench_service(dataset, repeat: int) -> dict[str, list[float]]:
+    from app.models import Filters
+    from app.services.addons import AddonsService
+    from core.database import get_db_cm
+
+    order = np.argsort(dataset.downloads[:, -1])[::-1]
+    popular = int(dataset.esoui_ids[order[0]])
+    median = int(dataset.esoui_ids[order[len(order) // 2]])
+    top_author = pd.Series(dataset.authors).value_counts().index[0]
+    top_50 = [int(esoui_id) for esoui_id in dataset.esoui_ids[order[:50]]]
+
+    cases = {
+        'get_downloads.popular_addon': lambda s: s.get_downloads(Filters(addons=[popular])),
+        'get_downloads.median_addon': lambda s: s.get_downloads(Filters(addons=[median])),
+        'get_downloads.top_author': lambda s: s.get_downloads(Filters(author=top_author)),
+        'get_downloads.1d_resolution': lambda s: s.get_downloads(Filters(addons=top_50[:10], resolution='1d')),
+        'get_download_speed.popular_addon': lambda s: s.get_download_speed(popular),
+        'get_download_speed.median_addon': lambda s: s.get_download_speed(median),
+        'search_for.title': lambda s: s.search_for('lib'),
+        'search_for.esoui_id': lambda s: s.search_for(str(median)),
+        'compare.50_addons_1h': lambda s: s.compare(top_50, '1h'),
+    }
+
+    samples = {}
+    with get_db_cm() as session:
+        addons_service = AddonsService(session)
+        for name, case in cases.items():
+            samples[f'service.{name}'] = measure(lambda: case(addons_service), repeat)
+
+    return samples
+
+
+STARTUP_SCRIPT = """
+import json, time
+from fastapi.testclient import TestClient
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+with TestClient(app):
+    print(json.dumps({'import': imported - start, 'ready': time.perf_counter() - start}))
+"""
+
+
+def bench_startup(repeat: int) -> dict[str, list[float]]:
+    # a fresh interpreter per sample, the way a uvicorn worker starts
+    samples = {}
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent.parent,
+        )
+        for name, seconds in json.loads(result.stdout.splitlines()[-1]).items():
+            samples.setdefault(f'startup.{name}', []).append(seconds)
+
+    return samples
+
+
+def bench_http(dataset, repeat: int, label: str) -> dict[str, list[float]]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    order = np.argsort(dataset.downloads[:, -1])[::-1]
+    popular = int(dataset.esoui_ids[order[0]])
+    top_author = pd.Series(dataset.authors).value_counts().index[0]
+    top_10 = '&'.join(f'addons={esoui_id}' for esoui_id in dataset.esoui_ids[order[:10]])
+    top_50 = '&'.join(f'addons={esoui_id}' for esoui_id in dataset.esoui_ids[order[:50]])
+
+    routes = {
+        '/': '/',
+        '/addon/{esoui_id}': f'/addon/{popular}',
+        '/author/{author}': f'/author/{top_author}',
+        '/api/downloads': f'/api/downloads?{top_10}',
+        '/api/addon/{esoui_id}': f'/api/addon/{popular}',
+        '/api/addon/{esoui_id}/speed': f'/api/addon/{popular}/speed',
+        '/api/addon/{esoui_id}/metrics': f'/api/addon/{popular}/metrics',
+        '/api/author/{author}': f'/api/author/{top_author}',
+        '/api/addons': '/api/addons?q=lib',
+        '/api/compare': f'/api/compare?{top_10}&resolution=1h',
+        '/api/compare (50 addons)': f'/api/compare?{top_50}&resolution=1h',
+    }
+
+    samples = {}
+    with TestClient(app) as client:
+        for route, url in routes.items():
+            def request():
+                client.get(url, headers={'Accept-Encoding': 'gzip, br'}).raise_for_status()
+
+            samples[f'http.{label}.{route}'] = measure(request, repeat)
+
+    return samples
+
+
+def run(args):
+    work_path = Path(tempfile.mkdtemp(prefix='esoui-bench-'))
+    # set before the app and pipeline modules are imported, they read these once
+    os.environ.setdefault('PAYLOADS_PATH', str(work_path / 'payloads'))
+    os.environ.setdefault('METRICS_PATH', str(work_path / 'metrics'))
+    os.environ.setdefault('ASSETS_PATH', str(work_path / 'assets'))
+
+    try:
+        bench(args, work_path)
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+
+def bench(args, work_path: Path):
+    from benchmarks import synthetic
+
+    results = {}
+
+    def record(samples: dict[str, list[float]]):
+        for name, values in samples.items():
+            results[name] = summarize(values)
+            print(f'{name:60} p50 {results[name]["p50_ms"]:10.1f} ms  p99 {results[name]["p99_ms"]:10.1f} ms')
+
+    start = time.perf_counter()
+    dataset = synthetic.generate(args.addons, args.snapshots + args.repeat, args.seed)
+    record({'setup.generate': [time.perf_counter() - start]})
+
+    # the last `repeat` snapshots are kept back and ingested by the pipeline benchmark
+    loaded = dataset.shape[1] - args.repeat
+
+    from core.database import create_tables
+    create_tables()
+
+    start = time.perf_counter()
+    counts = synthetic.load_database(dataset, loaded)
+    record({'setup.load_database': [time.perf_counter() - start]})
+    print(f'Loaded {counts}')
+
+    start = time.perf_counter()
+    files = synthetic.write_archive(dataset, work_path / 'archive', list(range(loaded - args.archive_files, loaded)))
+    record({'setup.write_archive': [time.perf_counter() - start]})
+
+    record(bench_startup(args.repeat))
+    record(bench_service(dataset, args.repeat))
+    record(bench_http(dataset, args.http_repeat, 'live'))
+    record(bench_archive(files, work_path))
+    record(bench_snapshot(dataset, loaded, args.repeat, work_path))
+    record(bench_http(dataset, args.http_repeat, 'payloads'))
+
+    report = {
+        **git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'params': {
+            'addons': args.addons,
+            'snapshots': args.snapshots,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'http_repeat': args.http_repeat,
+            'archive_files': args.archive_files,
+        },
+        'results': results,
+    }
+
+    output = args.output or RESULTS_PATH / f'{datetime.now():%Y%m%d_%H%M%S}_{report["commit"][:8] or "nogit"}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'Results saved to {output}')
+
+
+def compare(args):
+    baseline = json.loads(args.baseline.read_text())
+    current = json.loads(args.current.read_text())
+
+    if baseline['params'] != current['params']:
+        print(f'Warning: parameters differ\n  {baseline["params"]}\n  {current["params"]}')
+
+    output = io.StringIO()
+    regressions = 0
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+
+        before, after = baseline['results'][name][args.metric], result[args.metric]
+        ratio = after / before if before else float('inf')
+        flag = ''
+        if ratio > args.threshold and not name.startswith('setup.'):
+            flag = '  REGRESSION'
+            regressions += 1
+
+        output.write(f'{name:60} {before:10.1f} -> {after:10.1f} ms  x{ratio:5.2f}{flag}\n')
+
+    print(f'{baseline["commit"][:8]} -> {current["commit"][:8]} ({args.metric})')
+    print(output.getvalue(), end='')
+
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ESOUI downloads benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='generate data, time hot paths and save results')
+    run_parser.add_argument('--addons', type=int, default=3000)
+    run_parser.add_argument('--snapshots', type=int, default=1440, help='snapshots loaded into the database')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--repeat', type=int, default=5, help='repeats for pipeline and service benchmarks')
+    run_parser.add_argument('--http-repeat', type=int, default=50)
+    run_parser.add_argument('--archive-files', type=int, default=24)
+    run_parser.add_argument('--output', type=Path)
+
+    compare_parser = subparsers.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline', type=Path)
+    compare_parser.add_argument('current', type=Path)
+    compare_parser.add_argument('--metric', default='p50_ms')
+    compare_parser.add_argument('--threshold', type=float, default=1.2)
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
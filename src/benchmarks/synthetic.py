@@ -0,0 +1,268 @@
+"""Deterministic synthetic ESOUI data for benchmarks.
+
+Popularity and authorship follow power laws (a few addons and authors own most
+downloads), snapshots come every 30 minutes with occasional missed runs, and
+addons get new versions at random times - close enough to the real API to
+exercise the same query plans.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import csv
+import io
+import lzma
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from core.database import get_engine
+
+
+SNAPSHOT_INTERVAL = timedelta(minutes=30)
+DEPRECATED_CATEGORY = 157
+CATEGORIES = [39, 40, 41, 42, 43, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62, 79, 80, 81, 82, 83, 91, 92, 93, 96, 97]
+GAME_VERSIONS = ['101041', '101042', '101043', '101044', '101045', '101046', '101047']
+
+WORDS = [
+    'Lib', 'Map', 'Pins', 'Combat', 'Metrics', 'Bag', 'Bank', 'Guild', 'Store', 'Master', 'Tracker', 'Helper',
+    'Quest', 'Craft', 'Writ', 'Dungeon', 'Trial', 'Buff', 'Food', 'Set', 'Gear', 'Loot', 'Log', 'Chat', 'Mail',
+    'Furniture', 'Housing', 'Pet', 'Mount', 'Skill', 'Champion', 'Points', 'Timer', 'Alert', 'Notifier', 'UI',
+]
+
+
+@dataclass
+class Dataset:
+    esoui_ids: np.ndarray      # (n,)
+    titles: list[str]
+    authors: list[str]
+    categories: np.ndarray     # (n,)
+    timestamps: np.ndarray     # (m,) datetime64[s], UTC
+    downloads: np.ndarray      # (n, m) cumulative
+    favorites: np.ndarray      # (n, m)
+    update_times: np.ndarray   # (n, k) datetime64[s], NaT-padded
+    update_versions: list[list[str]]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.downloads.shape
+
+    def latest_update(self, esoui_id_index: int, timestamp: np.datetime64) -> int:
+        times = self.update_times[esoui_id_index]
+        return max(int(np.searchsorted(times[~np.isnat(times)], timestamp, side='right')) - 1, 0)
+
+    def records(self, snapshot: int) -> list[dict]:
+        """One snapshot in the shape returned by the ESOUI API."""
+        timestamp = self.timestamps[snapshot]
+        month_ago = max(0, snapshot - int(timedelta(days=30) / SNAPSHOT_INTERVAL))
+        downloads_monthly = self.downloads[:, snapshot] - self.downloads[:, month_ago]
+
+        records = []
+        for i, esoui_id in enumerate(self.esoui_ids):
+            update = self.latest_update(i, timestamp)
+            last_update = self.update_times[i, update]
+
+            records.append({
+                'id': int(esoui_id),
+                'categoryId': int(self.categories[i]),
+                'version': self.update_versions[i][update],
+                'lastUpdate': int(last_update.astype('datetime64[ms]').astype(np.int64)),
+                'title': self.titles[i],
+                'author': self.authors[i],
+                'fileInfoUri': f'https://www.esoui.com/downloads/info{esoui_id}.html',
+                'downloads': int(self.downloads[i, snapshot]),
+                'downloadsMonthly': int(downloads_monthly[i]),
+                'favorites': int(self.favorites[i, snapshot]),
+                'gameVersions': GAME_VERSIONS[-1 - i % 3:],
+                'checksum': f'{hash((int(esoui_id), update)) & 0xffffffff:08x}',
+                'donationUrl': None,
+            })
+
+        return records
+
+
+def generate(n_addons: int, n_snapshots: int, seed: int = 0, end: datetime | None = None) -> Dataset:
+    rng = np.random.default_rng(seed)
+
+    esoui_ids = np.sort(rng.choice(np.arange(100, n_addons * 3 + 100), n_addons, replace=False))
+
+    # a handful of authors publish most addons
+    n_authors = max(1, n_addons // 4)
+    author_weights = 1 / np.arange(1, n_authors + 1) ** 1.1
+    author_ids = rng.choice(n_authors, n_addons, p=author_weights / author_weights.sum())
+    authors = [f'author_{author_id:05d}' for author_id in author_ids]
+
+    titles = [
+        ' '.join(rng.choice(WORDS, rng.integers(1, 4), replace=False)) + f' {esoui_id}'
+        for esoui_id in esoui_ids
+    ]
+
+    categories = rng.choice(CATEGORIES, n_addons)
+    categories[rng.random(n_addons) < 0.05] = DEPRECATED_CATEGORY
+
+    # ~1% of runs are missed, plus a couple of multi-hour outages; runs are
+    # added until exactly `n_snapshots` of them are kept
+    n_runs = n_snapshots
+    while True:
+        kept = rng.random(n_runs) > 0.01
+        for outage in rng.integers(0, n_runs, 2):
+            kept[outage:outage + rng.integers(4, 16)] = False
+        kept[-1] = True
+
+        missing = n_snapshots - int(kept.sum())
+        if missing <= 0:
+            break
+        n_runs += missing
+
+    end = end or datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    interval = np.timedelta64(int(SNAPSHOT_INTERVAL.total_seconds()), 's')
+    start = np.datetime64(end.replace(tzinfo=None), 's') - (n_runs - 1) * interval
+    offsets = rng.integers(0, 90, n_runs).astype('timedelta64[s]')
+    timestamps = (start + np.arange(n_runs) * interval + offsets)[np.flatnonzero(kept)[-n_snapshots:]]
+
+    # power-law popularity: downloads per hour from well under one to thousands
+    popularity = rng.pareto(1.2, n_addons) + 0.01
+    hourly = popularity / popularity.max() * 2000
+    hours = np.diff(timestamps, prepend=timestamps[0] - interval) / np.timedelta64(1, 'h')
+    daily_cycle = 1 + 0.5 * np.sin(timestamps.astype('datetime64[h]').astype(np.int64) % 24 / 24 * 2 * np.pi)
+
+    initial = (hourly * 24 * rng.uniform(30, 2000, n_addons)).astype(np.int64)
+    increments = rng.poisson(np.outer(hourly, hours * daily_cycle)).astype(np.int64)
+    downloads = initial[:, None] + np.cumsum(increments, axis=1)
+
+    favorites_initial = (np.sqrt(initial) * rng.uniform(0.05, 0.5, n_addons)).astype(np.int64)
+    favorites_changes = rng.random(downloads.shape) < np.clip(hourly / 500, 0.001, 0.3)[:, None]
+    favorites = favorites_initial[:, None] + np.cumsum(favorites_changes, axis=1)
+
+    # updates: a few per addon before the window, more during it for popular ones
+    n_updates = np.clip(rng.poisson(2 + np.log1p(popularity) * 3), 1, 30)
+    update_times = np.full((n_addons, n_updates.max()), np.datetime64('NaT'), dtype='datetime64[s]')
+    update_versions = []
+    window = (timestamps[-1] - timestamps[0]).astype(np.int64)
+    for i, count in enumerate(n_updates):
+        times = np.sort(timestamps[0] + rng.integers(-window * 3, window, count).astype('timedelta64[s]'))
+        update_times[i, :count] = times
+
+        major, minor, patch = 1, 0, 0
+        versions = []
+        for _ in range(count):
+            step = rng.random()
+            if step < 0.05:
+                major, minor, patch = major + 1, 0, 0
+            elif step < 0.3:
+                minor, patch = minor + 1, 0
+            else:
+                patch += 1
+            versions.append(f'{major}.{minor}.{patch}')
+        update_versions.append(versions)
+
+    return Dataset(
+        esoui_ids=esoui_ids,
+        titles=titles,
+        authors=authors,
+        categories=categories,
+        timestamps=timestamps,
+        downloads=downloads,
+        favorites=favorites,
+        update_times=update_times,
+        update_versions=update_versions,
+    )
+
+
+def _copy(cursor, table: str, columns: list[str], rows) -> int:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY "{table}" ({", ".join(columns)}) FROM STDIN WITH CSV', buffer)
+
+    return count
+
+
+def _changes(values: np.ndarray) -> np.ndarray:
+    changed = np.ones(values.shape, dtype=bool)
+    changed[:, 1:] = values[:, 1:] != values[:, :-1]
+    return changed
+
+
+def load_database(dataset: Dataset, snapshots: int | None = None, chunk: int = 200) -> dict[str, int]:
+    """COPY the first `snapshots` snapshots into an empty database."""
+    n, m = dataset.shape
+    snapshots = m if snapshots is None else snapshots
+    timestamps = [pd.Timestamp(t).isoformat() for t in dataset.timestamps[:snapshots]]
+    month = int(timedelta(days=30) / SNAPSHOT_INTERVAL)
+
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM addon)')
+        if cursor.fetchone()[0]:
+            raise RuntimeError('Refusing to load synthetic data into a non-empty database, point ADDONS_DATABASE_NAME at a scratch one')
+
+        counts = {}
+        counts['addon'] = _copy(cursor, 'addon', ['id', 'esoui_id', 'title', 'author', 'category', 'url'], (
+            (f'00000000-0000-4000-8000-{esoui_id:012d}', esoui_id, dataset.titles[i], dataset.authors[i],
+             dataset.categories[i], f'https://www.esoui.com/downloads/info{esoui_id}.html')
+            for i, esoui_id in enumerate(dataset.esoui_ids)
+        ))
+
+        counts['downloads'] = 0
+        for start in range(0, snapshots, chunk):
+            stop = min(start + chunk, snapshots)
+            counts['downloads'] += _copy(cursor, 'downloads', ['esoui_id', 'timestamp', 'downloads'], (
+                (esoui_id, timestamps[j], dataset.downloads[i, j])
+                for j in range(start, stop)
+                for i, esoui_id in enumerate(dataset.esoui_ids)
+            ))
+
+        counts['update'] = _copy(cursor, 'update', ['esoui_id', 'timestamp', 'version', 'checksum'], (
+            (esoui_id, pd.Timestamp(time).isoformat(), version, f'{hash((int(esoui_id), k)) & 0xffffffff:08x}')
+            for i, esoui_id in enumerate(dataset.esoui_ids)
+            for k, (time, version) in enumerate(zip(dataset.update_times[i], dataset.update_versions[i]))
+            if time <= dataset.timestamps[snapshots - 1]
+        ))
+
+        favorites = dataset.favorites[:, :snapshots]
+        rows, columns = np.nonzero(_changes(favorites))
+        counts['favorites'] = _copy(cursor, 'favorites', ['esoui_id', 'timestamp', 'favorites'], (
+            (dataset.esoui_ids[i], timestamps[j], favorites[i, j]) for i, j in zip(rows, columns)
+        ))
+
+        downloads = dataset.downloads[:, :snapshots]
+        monthly = downloads - downloads[:, np.maximum(np.arange(snapshots) - month, 0)]
+        rows, columns = np.nonzero(_changes(monthly))
+        counts['downloads_monthly'] = _copy(cursor, 'downloads_monthly', ['esoui_id', 'timestamp', 'downloads_monthly'], (
+            (dataset.esoui_ids[i], timestamps[j], monthly[i, j]) for i, j in zip(rows, columns)
+        ))
+
+        cursor.execute('ANALYZE')
+        connection.commit()
+    finally:
+        connection.close()
+
+    return counts
+
+
+def write_archive(dataset: Dataset, output_path: Path, snapshots: list[int]) -> list[Path]:
+    """Write snapshots the way `take_esoui_snapshot` archives them."""
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for snapshot in snapshots:
+        df = pd.DataFrame(dataset.records(snapshot))
+        del df['donationUrl']
+
+        timestamp = pd.Timestamp(dataset.timestamps[snapshot]).strftime('%Y%m%d_%H%M%S')
+        path = output_path / f'snapshot_{timestamp}_synthetic-{snapshot}.parquet.xz'
+
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        path.write_bytes(lzma.compress(buffer.getvalue(), preset=9 | lzma.PRESET_EXTREME))
+
+        paths.append(path)
+
+    return paths
@@ -0,0 +1,144 @@
+"""Chart data served by the website and pre-rendered to payloads by the pipeline."""
+from collections import defaultdict
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy import Row, select
+from sqlalchemy.orm import Session
+
+from core import resampling
+from core.resampling import Resolution
+from core.schemas import AddonSchema, DownloadsSchema, FavoritesSchema, MonthlyDownloadsSchema
+
+
+SPEED_RESOLUTION: Resolution = '30m'
+SPEED_SMOOTHING = timedelta(hours=2, minutes=30)
+
+
+class DownloadResponse(BaseModel):
+    name: str
+    x: list[datetime]
+    y: list[Optional[int]]
+    author: Optional[str] = None
+    max: Optional[int] = None
+
+
+class AddonDownloadSpeedResponse(BaseModel):
+    x: list[datetime]
+    y: list[Optional[float]]
+
+
+class MetricResponse(BaseModel):
+    x: list[datetime]
+    y: list[int]
+
+
+class AddonMetricsResponse(BaseModel):
+    # stored only when the value changes, so each point holds until the next one
+    favorites: MetricResponse
+    downloads_monthly: MetricResponse
+
+
+class Filters(BaseModel):
+    addons: Optional[list[int]] = None
+    author: Optional[str] = None
+    deprecated: Optional[bool] = False
+    resolution: Optional[Resolution] = None
+
+
+class ChartsService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _get_addons_downloads(self, filters: Filters) -> Sequence[Row]:
+        get_addons = (
+            select(
+                DownloadsSchema.esoui_id,
+                DownloadsSchema.timestamp,
+                DownloadsSchema.downloads,
+                AddonSchema.title,
+            )
+            .join(AddonSchema)
+            .order_by(DownloadsSchema.timestamp)
+        )
+
+        # if not filters.addons and not filters.author:
+        #     filters = Filters(
+        #         addons=[4035, 4141, 4108, 4037, 4112, 4032, 4082]
+        #     )
+
+        if addons := filters.addons:
+            get_addons = get_addons.where(DownloadsSchema.esoui_id.in_(addons))
+
+        if author := filters.author:
+            get_addons = get_addons.add_columns(AddonSchema.author).where(AddonSchema.author == author)
+
+        if not filters.deprecated:
+            get_addons = get_addons.where(AddonSchema.category != 157)
+
+        return self.db.execute(get_addons).all()
+
+    def get_downloads(self, filters: Filters) -> list[dict]:
+        addons = self._get_addons_downloads(filters)  
+
+        plotly_data = defaultdict(lambda: {'x': [], 'y': [], 'name': None})
+
+        for addon in addons:  # TODO: fix very bad naming
+            addon_id = addon.esoui_id
+            plotly_data[addon_id]['name'] = f'{addon.title:.20} ({addon_id})'
+            plotly_data[addon_id]['x'].append(addon.timestamp)
+            plotly_data[addon_id]['y'].append(addon.downloads)
+            
+            # if author:
+            #     plotly_data[addon_id]['author'] = result.author
+
+        if resolution := filters.resolution:
+            for data in plotly_data.values():
+                series = resampling.resample(data['x'], data['y'], resolution)
+                data.update(resampling.to_plot(series, as_int=True))
+
+        responce = []
+        for data in plotly_data.values():
+            responce.append(DownloadResponse(**data).model_dump(mode='json'))
+
+        return responce
+
+    def get_download_speed(self, addon_id: int, resolution: resampling.Resolution = SPEED_RESOLUTION) -> dict:
+        get_downloads = (
+            select(
+                DownloadsSchema.timestamp,
+                DownloadsSchema.downloads,
+            )
+            .where(DownloadsSchema.esoui_id == addon_id)
+            .order_by(DownloadsSchema.timestamp)
+        )
+
+        results = self.db.execute(get_downloads).all()
+        timestamps, downloads = zip(*results) if results else ((), ())
+
+        series = resampling.resample(timestamps, downloads, resolution)
+        speed = resampling.rolling_mean(resampling.rate(series), SPEED_SMOOTHING)
+
+        return AddonDownloadSpeedResponse.model_validate(resampling.to_plot(speed)).model_dump(mode='json')
+
+    def _get_metric(self, schema, column: str, addon_id: int) -> dict:
+        get_values = (
+            select(schema.timestamp, getattr(schema, column))
+            .where(schema.esoui_id == addon_id)
+            .order_by(schema.timestamp)
+        )
+
+        results = self.db.execute(get_values).all()
+
+        return {
+            'x': [result[0] for result in results],
+            'y': [result[1] for result in results],
+        }
+
+    def get_metrics(self, addon_id: int) -> dict:
+        return AddonMetricsResponse(
+            favorites=self._get_metric(FavoritesSchema, 'favorites', addon_id),
+            downloads_monthly=self._get_metric(MonthlyDownloadsSchema, 'downloads_monthly', addon_id),
+        ).model_dump(mode='json')
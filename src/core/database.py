@@ -1,21 +1,37 @@
 from contextlib import contextmanager
+from functools import cache
 import os
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Engine, create_engine, inspect
+from sqlalchemy.orm import Session, sessionmaker
 
+from .metrics import instrument_engine
 from .schemas import Base
 
 
 DATABASE_URL = f'postgresql://{os.getenv('ADDONS_USERNAME')}:{os.getenv('ADDONS_PASSWORD')}@{os.getenv('ADDONS_DATABASE_HOST')}:{os.getenv('ADDONS_DATABASE_PORT')}/{os.getenv('ADDONS_DATABASE_NAME')}'
 
 
-ENGINE = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=ENGINE)
+@cache
+def get_engine() -> Engine:
+    engine = create_engine(DATABASE_URL)
+    instrument_engine(engine)
+
+    return engine
+
+
+@cache
+def _get_sessionmaker() -> sessionmaker:
+    return sessionmaker(bind=get_engine())
+
+
+def get_session() -> Session:
+    """A new session bound to the engine, created on first use so importing this module doesn't load the driver."""
+    return _get_sessionmaker()()
 
 
 def get_db():
-    db = Session()
+    db = get_session()
     try:
         yield db
     finally:
@@ -23,7 +39,7 @@ def get_db():
 
 @contextmanager
 def get_db_cm():
-    db = Session()
+    db = get_session()
     try:
         yield db
     finally:
@@ -31,4 +47,27 @@ def get_db_cm():
 
 
 def create_tables():
-    Base.metadata.create_all(bind=ENGINE)
+    Base.metadata.create_all(bind=get_engine())
+
+
+def ensure_schema() -> list[str]:
+    """Create missing tables, checking all of them with a single catalog query."""
+    engine = get_engine()
+    missing = sorted(set(Base.metadata.tables) - set(inspect(engine).get_table_names()))
+
+    if missing:
+        Base.metadata.create_all(bind=engine)
+
+    return missing
+
+
+def warm_pool(connections: int | None = None) -> int:
+    """Open pooled connections up front so the first requests don't pay for them."""
+    engine = get_engine()
+    connections = engine.pool.size() if connections is None else connections
+
+    opened = [engine.connect() for _ in range(connections)]
+    for connection in opened:
+        connection.close()
+
+    return len(opened)
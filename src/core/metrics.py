@@ -0,0 +1,167 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import hashlib
+import heapq
+import itertools
+import os
+from pathlib import Path
+import re
+import threading
+import time
+
+from prometheus_client import Gauge, Histogram
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import Engine, event
+
+
+METRICS_PATH = Path(os.getenv('METRICS_PATH', Path(__file__).parent.parent / 'output' / 'metrics'))
+
+SLOW_STATEMENTS_LIMIT = 20
+MAX_PARAMS_LENGTH = 500
+
+STATEMENT_DURATION = Histogram(
+    'db_statement_duration_seconds',
+    'Time spent executing SQL statements',
+    ['statement'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+# expanding IN (...) and multi-row VALUES render a placeholder per item, which
+# would turn every list length into its own statement
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*%\(\w+\)s\s*,)+\s*%\(\w+\)s\s*\)')
+_VALUES_LIST = re.compile(r'(VALUES \(\.\.\.\))(?:, \(\.\.\.\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_statement(statement: str) -> str:
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _PLACEHOLDER_LIST.sub('(...)', statement)
+    return _VALUES_LIST.sub(r'\1', statement)
+
+
+def statement_id(statement: str) -> str:
+    return hashlib.sha1(statement.encode()).hexdigest()[:12]
+
+
+@dataclass
+class StatementStats:
+    statement: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+@dataclass
+class SlowStatements:
+    limit: int = SLOW_STATEMENTS_LIMIT
+    stats: dict[str, StatementStats] = field(default_factory=dict)
+    slowest: list[tuple] = field(default_factory=list)  # min-heap of the slowest samples
+
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    _counter: itertools.count = field(default_factory=itertools.count)
+
+    def observe(self, statement: str, parameters, seconds: float):
+        normalized = normalize_statement(statement)
+        key = statement_id(normalized)
+
+        STATEMENT_DURATION.labels(statement=key).observe(seconds)
+
+        with self._lock:
+            stats = self.stats.setdefault(key, StatementStats(normalized))
+            stats.count += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+            if len(self.slowest) < self.limit or seconds > self.slowest[0][0]:
+                sample = (
+                    seconds,
+                    next(self._counter),
+                    key,
+                    repr(parameters)[:MAX_PARAMS_LENGTH],
+                    datetime.now(timezone.utc).isoformat(),
+                )
+                if len(self.slowest) < self.limit:
+                    heapq.heappush(self.slowest, sample)
+                else:
+                    heapq.heapreplace(self.slowest, sample)
+
+    def report(self) -> dict:
+        with self._lock:
+            statements = sorted(self.stats.items(), key=lambda item: item[1].total_seconds, reverse=True)
+            slowest = sorted(self.slowest, reverse=True)
+
+            return {
+                'statements': [
+                    {
+                        'id': key,
+                        'statement': stats.statement,
+                        'count': stats.count,
+                        'total_seconds': stats.total_seconds,
+                        'mean_seconds': stats.total_seconds / stats.count,
+                        'max_seconds': stats.max_seconds,
+                    }
+                    for key, stats in statements
+                ],
+                'slowest': [
+                    {
+                        'id': key,
+                        'statement': self.stats[key].statement,
+                        'seconds': seconds,
+                        'parameters': parameters,
+                        'at': at,
+                    }
+                    for seconds, _, key, parameters, at in slowest
+                ],
+            }
+
+
+SLOW_STATEMENTS = SlowStatements()
+
+
+def instrument_engine(engine: Engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['query_start_time'].pop()
+        SLOW_STATEMENTS.observe(statement, parameters, seconds)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        start_times = context.connection.info.get('query_start_time') if context.connection else None
+        if start_times:
+            start_times.pop()
+
+    pool = engine.pool
+    for name, description, attribute in (
+        ('db_pool_size', 'Configured size of the connection pool', 'size'),
+        ('db_pool_checked_out', 'Connections currently in use', 'checkedout'),
+        ('db_pool_checked_in', 'Idle connections in the pool', 'checkedin'),
+        ('db_pool_overflow', 'Connections opened above the pool size', 'overflow'),
+    ):
+        if hasattr(pool, attribute):
+            Gauge(name, description).set_function(getattr(pool, attribute))
+
+
+class TextfileCollector:
+    """Metrics written by other processes (the data pipeline) as `*.prom` files."""
+
+    def __init__(self, metrics_path: Path = METRICS_PATH):
+        self.metrics_path = metrics_path
+
+    def collect(self):
+        if not self.metrics_path.exists():
+            return
+
+        # every flow writes its own file, but they share metric names
+        families = {}
+        for path in sorted(self.metrics_path.glob('*.prom')):
+            for family in text_string_to_metric_families(path.read_text()):
+                if family.name in families:
+                    families[family.name].samples.extend(family.samples)
+                else:
+                    families[family.name] = family
+
+        yield from families.values()
@@ -0,0 +1,152 @@
+from collections.abc import Iterable
+from datetime import timedelta
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import time
+from urllib.parse import quote
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped without it
+    brotli = None
+
+
+PAYLOADS_PATH = Path(os.getenv('PAYLOADS_PATH', Path(__file__).parent.parent / 'output' / 'payloads'))
+
+# payloads are rewritten after every snapshot, which is taken every 30 minutes
+PAYLOAD_CACHE_CONTROL = 'public, max-age=1800, stale-while-revalidate=86400'
+
+# payloads of addons that stopped changing are still re-rendered this often,
+# the charts keep growing and the speed smoothing window slides past the last change
+PAYLOAD_MAX_AGE = timedelta(hours=3)
+
+ENCODINGS = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+# filenames are limited to 255 bytes, percent-encoding triples non-ASCII names
+MAX_KEY_LENGTH = 200
+
+
+def payload_path(kind: str, key: int | str) -> Path:
+    name = quote(str(key), safe='')
+    if len(name) > MAX_KEY_LENGTH:
+        # `#` is always quoted, so hashed names can't clash with short ones
+        name = '#' + hashlib.sha256(str(key).encode()).hexdigest()
+
+    return PAYLOADS_PATH / kind / f'{name}.json'
+
+
+def write_atomic(path: Path, content: bytes):
+    # per-process temp names, several app workers may write the same file
+    temp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    temp_path.write_bytes(content)
+    os.replace(temp_path, path)
+
+
+def write_variants(path: Path, content: bytes, only_smaller: bool = False):
+    """Write `content` to `path` along with its precompressed variants."""
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+
+    # compressed variants go first so a reader never picks up a fresh file
+    # next to a stale .gz/.br
+    for suffix, compressed in variants.items():
+        if not only_smaller or len(compressed) < len(content):
+            write_atomic(path.with_name(path.name + suffix), compressed)
+    write_atomic(path, content)
+
+
+def parse_accept_encoding(accept_encoding: str) -> dict[str, float]:
+    """Quality of every encoding listed in an Accept-Encoding header."""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        encoding, *params = (part.strip() for part in item.split(';'))
+        if not encoding:
+            continue
+
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        qualities[encoding.lower()] = quality
+
+    return qualities
+
+
+def find_variant(path: Path, accept_encoding: str = '') -> tuple[Path, str | None]:
+    qualities = parse_accept_encoding(accept_encoding)
+    for encoding, suffix in ENCODINGS.items():
+        # `q=0` means not acceptable, an explicit entry overrides `*`
+        if qualities.get(encoding, qualities.get('*', 0.0)) <= 0:
+            continue
+
+        variant = path.with_name(path.name + suffix)
+        if variant.exists():
+            return variant, encoding
+
+    return path, None
+
+
+def write_payload(kind: str, key: int | str, data) -> int:
+    path = payload_path(kind, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    content = json.dumps(data, separators=(',', ':'), default=str).encode()
+    write_variants(path, content)
+
+    return len(content)
+
+
+def read_payload(kind: str, key: int | str):
+    path = payload_path(kind, key)
+
+    try:
+        return json.loads(path.read_bytes())
+    except OSError:
+        return None
+
+
+def payload_age(kind: str, key: int | str) -> timedelta | None:
+    """Time since the payload was written, or None if not rendered yet."""
+    try:
+        modified = payload_path(kind, key).stat().st_mtime
+    except OSError:
+        return None
+
+    return timedelta(seconds=time.time() - modified)
+
+
+def clear_payloads(kinds: Iterable[str]) -> int:
+    """Remove rendered payloads of `kinds`, the website queries the database until they are rendered again."""
+    removed = 0
+    for kind in kinds:
+        kind_path = PAYLOADS_PATH / kind
+        if kind_path.is_dir():
+            removed += sum(1 for _ in kind_path.glob('*.json'))
+            shutil.rmtree(kind_path)
+
+    return removed
+
+
+def find_payload(kind: str, key: int | str, accept_encoding: str = '') -> tuple[Path, str | None] | None:
+    """Best precompressed variant the client accepts, or None if not rendered yet."""
+    path = payload_path(kind, key)
+    try:
+        if not path.is_file():
+            return None
+
+        return find_variant(path, accept_encoding)
+    except OSError:
+        return None
@@ -0,0 +1,23 @@
+from sqlalchemy import ScalarSelect, select
+from sqlalchemy.orm import InstrumentedAttribute
+
+from core.schemas import AddonSchema
+
+
+def per_addon(column: InstrumentedAttribute, earliest: bool = False) -> ScalarSelect:
+    """`column` of each addon's latest (or earliest) row, correlated with `addon`.
+
+    Selected from `addon` it is one primary key probe per addon, instead of
+    walking the whole table the way DISTINCT ON or max() would.
+    """
+    schema = column.class_
+    order = schema.timestamp.asc() if earliest else schema.timestamp.desc()
+
+    return (
+        select(column)
+        .where(schema.esoui_id == AddonSchema.esoui_id)
+        .order_by(order)
+        .limit(1)
+        .correlate(AddonSchema)
+        .scalar_subquery()
+    )
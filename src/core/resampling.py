@@ -0,0 +1,234 @@
+from collections.abc import Hashable, Iterable, Mapping
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+
+
+Resolution = Literal['30m', '1h', '1d']
+
+RESOLUTIONS: dict[str, timedelta] = {
+    '30m': timedelta(minutes=30),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+
+# snapshots are taken every 30 minutes, so two real observations further apart
+# than this mean the pipeline missed runs in between
+MAX_GAP = timedelta(hours=2)
+
+
+@dataclass(frozen=True)
+class Series:
+    x: np.ndarray    # datetime64[ns], fixed step
+    y: np.ndarray    # float64, NaN where there is nothing to interpolate from
+    gap: np.ndarray  # bool, True where y is not backed by nearby observations
+
+
+@dataclass(frozen=True)
+class AlignedSeries:
+    x: np.ndarray    # datetime64[ns], shared by all rows
+    keys: list[Hashable]
+    y: np.ndarray    # float64, shape (len(keys), len(x))
+    gap: np.ndarray  # bool, shape (len(keys), len(x))
+
+    def row(self, i: int) -> Series:
+        return Series(self.x, self.y[i], self.gap[i])
+
+
+def _ns(delta: timedelta) -> int:
+    return delta // timedelta(microseconds=1) * 1000
+
+
+def _step(resolution: Resolution) -> int:
+    try:
+        return _ns(RESOLUTIONS[resolution])
+    except KeyError:
+        raise ValueError(f'Unknown resolution: {resolution!r}, expected one of {list(RESOLUTIONS)}') from None
+
+
+def _to_ns(timestamps: Iterable[datetime]) -> np.ndarray:
+    index = pd.DatetimeIndex(timestamps)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+
+    return index.as_unit('ns').asi8
+
+
+def _grid(start: int, end: int, step: int) -> np.ndarray:
+    first = -(-start // step) * step
+    last = end // step * step
+
+    return np.arange(first, last + 1, step, dtype=np.int64)
+
+
+def _interpolate(t: np.ndarray, v: np.ndarray, grid: np.ndarray, threshold: int) -> tuple[np.ndarray, np.ndarray]:
+    if len(t) == 0:
+        return np.full(len(grid), np.nan), np.ones(len(grid), dtype=bool)
+
+    y = np.interp(grid, t, v, left=np.nan, right=np.nan)
+
+    right = np.searchsorted(t, grid, side='left').clip(max=len(t) - 1)
+    left = (right - 1).clip(min=0)
+    exact = t[right] == grid
+    gap = ~exact & (t[right] - t[left] > threshold)
+    gap |= np.isnan(y)
+
+    return y, gap
+
+
+def _prepare(timestamps: Iterable[datetime], values: Iterable[float]) -> tuple[np.ndarray, np.ndarray]:
+    t = _to_ns(timestamps)
+    v = np.asarray(values, dtype=np.float64)
+
+    if len(t) > 1 and np.any(t[1:] < t[:-1]):
+        order = np.argsort(t, kind='stable')
+        t, v = t[order], v[order]
+
+    return t, v
+
+
+def resample(
+    timestamps: Iterable[datetime],
+    values: Iterable[float],
+    resolution: Resolution,
+    max_gap: timedelta = MAX_GAP,
+) -> Series:
+    """Put a cumulative counter onto a fixed grid by linear interpolation.
+
+    Grid points falling into a hole wider than `max_gap` (or one step, whichever
+    is larger) still get an interpolated value but are flagged in `gap`.
+    """
+    step = _step(resolution)
+    t, v = _prepare(timestamps, values)
+
+    if len(t) == 0:
+        grid = np.empty(0, dtype=np.int64)
+    else:
+        grid = _grid(t[0], t[-1], step)
+
+    threshold = max(_ns(max_gap), step)
+    y, gap = _interpolate(t, v, grid, threshold)
+
+    return Series(grid.astype('datetime64[ns]'), y, gap)
+
+
+def align(
+    series: Mapping[Hashable, tuple[Iterable[datetime], Iterable[float]]],
+    resolution: Resolution,
+    max_gap: timedelta = MAX_GAP,
+) -> AlignedSeries:
+    """Resample several cumulative counters onto one common grid."""
+    step = _step(resolution)
+    threshold = max(_ns(max_gap), step)
+
+    keys = list(series)
+    prepared = [_prepare(*series[key]) for key in keys]
+    bounds = [(t[0], t[-1]) for t, _ in prepared if len(t)]
+
+    if bounds:
+        starts, ends = zip(*bounds)
+        grid = _grid(min(starts), max(ends), step)
+    else:
+        grid = np.empty(0, dtype=np.int64)
+
+    y = np.empty((len(keys), len(grid)), dtype=np.float64)
+    gap = np.empty((len(keys), len(grid)), dtype=bool)
+    for i, (t, v) in enumerate(prepared):
+        y[i], gap[i] = _interpolate(t, v, grid, threshold)
+
+    return AlignedSeries(grid.astype('datetime64[ns]'), keys, y, gap)
+
+
+def increments(series: Series | AlignedSeries) -> Series | AlignedSeries:
+    """Counter growth within each grid step, stamped with the step's end."""
+    y = np.diff(series.y, axis=-1)
+    gap = series.gap[..., 1:] | series.gap[..., :-1]
+
+    if isinstance(series, AlignedSeries):
+        return AlignedSeries(series.x[1:], series.keys, y, gap)
+
+    return Series(series.x[1:], y, gap)
+
+
+def rate(series: Series | AlignedSeries, per: timedelta = timedelta(hours=1)) -> Series | AlignedSeries:
+    """Counter growth per `per`; steps touching a gap are NaN."""
+    deltas = increments(series)
+
+    if len(series.x) < 2:
+        return deltas
+
+    step = (series.x[1] - series.x[0]).astype('timedelta64[ns]').astype(np.int64)
+    y = deltas.y * (_ns(per) / step)
+    y[deltas.gap] = np.nan
+
+    if isinstance(deltas, AlignedSeries):
+        return AlignedSeries(deltas.x, deltas.keys, y, deltas.gap)
+
+    return Series(deltas.x, y, deltas.gap)
+
+
+def rolling_mean(series: Series, window: timedelta) -> Series:
+    """Centered moving average over a fixed span of time rather than of rows."""
+    if len(series.x) < 2:
+        return series
+
+    step = (series.x[1] - series.x[0]).astype('timedelta64[ns]').astype(np.int64)
+    points = max(1, _ns(window) // step)
+
+    y = pd.Series(series.y).rolling(points, center=True, min_periods=1).mean().to_numpy(copy=True)
+    y[series.gap] = np.nan
+
+    return Series(series.x, y, series.gap)
+
+
+def share(series: AlignedSeries) -> np.ndarray:
+    """Each row's fraction of the column total."""
+    total = np.nansum(series.y, axis=0)
+
+    return series.y / np.where(total > 0, total, np.nan)
+
+
+def rank(series: AlignedSeries) -> np.ndarray:
+    """1-based rank of each row within its column, highest value first."""
+    y = np.where(np.isnan(series.y), -np.inf, series.y)
+    order = np.argsort(-y, axis=0, kind='stable')
+
+    ranks = np.empty(y.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(1, len(y) + 1)[:, None], y.shape), axis=0)
+    ranks[np.isnan(series.y)] = np.nan
+
+    return ranks
+
+
+def to_list(
+    values: np.ndarray,
+    mask: np.ndarray | None = None,
+    as_int: bool = False,
+    decimals: int | None = None,
+) -> list:
+    """JSON-friendly list; NaN and masked values become None."""
+    missing = np.isnan(values)
+    if mask is not None:
+        missing |= mask
+
+    if as_int:
+        values = np.rint(np.nan_to_num(values)).astype(np.int64)
+    elif decimals is not None:
+        # full float precision is mostly noise and triples the JSON size
+        values = np.round(values, decimals)
+
+    result = values.astype(object)
+    result[missing] = None
+
+    return result.tolist()
+
+
+def to_plot(series: Series, mask_gaps: bool = True, as_int: bool = False) -> dict[str, list]:
+    """Plotly-friendly lists; masked points become None so the line breaks."""
+    return {
+        'x': pd.DatetimeIndex(series.x).to_pydatetime().tolist(),
+        'y': to_list(series.y, series.gap if mask_gaps else None, as_int),
+    }
@@ -26,6 +26,22 @@ class DownloadsSchema(Base):
     downloads: Mapped[int] = mapped_column(nullable=False)
 
 
+class FavoritesSchema(Base):
+    __tablename__ = 'favorites'
+
+    esoui_id: Mapped[int] = mapped_column(ForeignKey('addon.esoui_id'), primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    favorites: Mapped[int] = mapped_column(nullable=False)
+
+
+class MonthlyDownloadsSchema(Base):
+    __tablename__ = 'downloads_monthly'
+
+    esoui_id: Mapped[int] = mapped_column(ForeignKey('addon.esoui_id'), primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    downloads_monthly: Mapped[int] = mapped_column(nullable=False)
+
+
 # class DownloadSpeed(Base):
 #     __tablename__ = 'download_speeds'
     
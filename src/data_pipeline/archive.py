@@ -0,0 +1,205 @@
+"""Ad-hoc queries over any field of the snapshot archive.
+
+The archive is decompressed once into per-day parquet files (`output/cache`),
+so repeated queries never pay the xz cost again.
+
+    python data_pipeline/archive.py sync
+    python data_pipeline/archive.py history favorites --addon 1245 --since 2025-06-01
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime, timezone
+import io
+import json
+import logging
+import lzma
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+
+OUTPUT_PATH = Path(__file__).parent.parent / 'output'
+CACHE_PATH = OUTPUT_PATH / 'cache'
+
+ARCHIVE_PATTERN = 'snapshot_*.parquet.xz'
+
+# a file still being written by `xz`, or a damaged one
+UNREADABLE = (lzma.LZMAError, EOFError, OSError, pa.ArrowException)
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_timestamp(path: Path) -> datetime:
+    # snapshot_<%Y%m%d>_<%H%M%S>_<flow run id>.parquet.xz
+    _, date, time, *_ = path.name.split('_')
+    return datetime.strptime(date + time, '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+
+
+def read_snapshot(path: Path) -> pa.Table:
+    with lzma.open(path) as f:
+        table = pq.read_table(io.BytesIO(f.read()))
+
+    snapshot = pa.array([snapshot_timestamp(path)] * len(table), pa.timestamp('us', tz='UTC'))
+    return table.append_column('snapshot', snapshot)
+
+
+def find_archive_files(archive_path: Path = OUTPUT_PATH) -> list[Path]:
+    return sorted(archive_path.glob(ARCHIVE_PATTERN))
+
+
+def _day_path(day: str, cache_path: Path) -> Path:
+    return cache_path / f'day_{day}.parquet'
+
+
+def _sources_path(day_path: Path) -> Path:
+    return day_path.with_suffix('.sources.json')
+
+
+def _read_sources(day_path: Path) -> dict[str, int] | None:
+    try:
+        return json.loads(_sources_path(day_path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def sync_cache(archive_path: Path = OUTPUT_PATH, cache_path: Path = CACHE_PATH) -> list[Path]:
+    """Rebuild every cached day whose source files (names and sizes) changed since it was built.
+
+    Files that can't be decompressed are left out of their day and retried
+    once their size changes, e.g. when `xz` finishes writing them.
+    """
+    cache_path.mkdir(parents=True, exist_ok=True)
+
+    days = defaultdict(list)
+    for path in find_archive_files(archive_path):
+        days[snapshot_timestamp(path).strftime('%Y%m%d')].append(path)
+
+    rebuilt = []
+    for day, sources in days.items():
+        day_path = _day_path(day, cache_path)
+        # mtimes survive `cp -p` and `rsync -a`, so they can't tell restored files apart
+        recorded = {source.name: source.stat().st_size for source in sources}
+
+        if day_path.exists() and _read_sources(day_path) == recorded:
+            continue
+
+        tables = []
+        for source in sources:
+            try:
+                tables.append(read_snapshot(source))
+            except UNREADABLE as e:
+                logger.warning(f'Skipping unreadable archive file {source.name}: {e}')
+
+        if tables:
+            table = pa.concat_tables(tables, promote_options='permissive')
+
+            temp_path = day_path.with_name(f'.{day_path.name}.tmp')
+            pq.write_table(table, temp_path, compression='zstd')
+            temp_path.replace(day_path)
+
+            rebuilt.append(day_path)
+        else:
+            day_path.unlink(missing_ok=True)
+
+        _sources_path(day_path).write_text(json.dumps(recorded, indent=2))
+
+    return rebuilt
+
+
+def open_dataset(cache_path: Path = CACHE_PATH) -> ds.Dataset:
+    files = sorted(cache_path.glob('day_*.parquet'))
+    if not files:
+        raise FileNotFoundError(f'Archive cache is empty, run sync first: {cache_path}')
+
+    # fields were added to the API over time, so schemas differ between days
+    schema = pa.unify_schemas([pq.read_schema(f) for f in files], promote_options='permissive')
+
+    return ds.dataset(files, schema=schema, format='parquet')
+
+
+def _utc(value: datetime) -> pd.Timestamp:
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tz is None else value.tz_convert('UTC')
+
+
+def history(
+    field: str,
+    addons: list[int] | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    changes_only: bool = False,
+    cache_path: Path = CACHE_PATH,
+) -> pd.DataFrame:
+    """Values of one archived field over time, as `snapshot, id, <field>` rows."""
+    dataset = open_dataset(cache_path)
+
+    if field not in dataset.schema.names:
+        raise KeyError(f'Unknown field: {field!r}, available: {sorted(dataset.schema.names)}')
+
+    condition = pc.scalar(True)
+    if addons:
+        condition &= pc.field('id').isin(addons)
+    if since:
+        condition &= pc.field('snapshot') >= _utc(since)
+    if until:
+        condition &= pc.field('snapshot') < _utc(until)
+
+    columns = ['snapshot', 'id'] if field == 'id' else ['snapshot', 'id', field]
+    df = (
+        dataset.to_table(columns=columns, filter=condition)
+        .to_pandas()
+        .sort_values(['id', 'snapshot'], ignore_index=True)
+    )
+
+    if changes_only and field != 'id':
+        values = df[field].map(str)
+        changed = (df['id'] != df['id'].shift()) | (values != values.shift())
+        df = df[changed].reset_index(drop=True)
+
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the snapshot archive')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('sync', help='decompress new archive files into the local cache')
+
+    fields_parser = subparsers.add_parser('fields', help='list fields available in the archive')
+    fields_parser.add_argument('--no-sync', action='store_true')
+
+    history_parser = subparsers.add_parser('history', help='print the history of one field')
+    history_parser.add_argument('field')
+    history_parser.add_argument('--addon', type=int, action='append', dest='addons')
+    history_parser.add_argument('--since', type=datetime.fromisoformat)
+    history_parser.add_argument('--until', type=datetime.fromisoformat)
+    history_parser.add_argument('--changes-only', action='store_true')
+    history_parser.add_argument('--csv', type=Path, help='write to a file instead of printing')
+    history_parser.add_argument('--no-sync', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'sync' or not args.no_sync:
+        rebuilt = sync_cache()
+        print(f'{len(rebuilt)} cached days rebuilt')
+
+    if args.command == 'fields':
+        for field in open_dataset().schema:
+            print(f'{field.name}: {field.type}')
+
+    elif args.command == 'history':
+        df = history(args.field, args.addons, args.since, args.until, args.changes_only)
+
+        if args.csv:
+            df.to_csv(args.csv, index=False)
+        else:
+            with pd.option_context('display.max_rows', None, 'display.width', None):
+                print(df)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""Extractors turn validated snapshots into rows of one table.
+
+Archive replay feeds every decompressed file to all chosen extractors, so one
+pass over the archive serves every backfill. Rows are buffered and written in
+batches; `addons` is always written first because the other tables reference it.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.schemas import AddonSchema, DownloadsSchema, FavoritesSchema, MonthlyDownloadsSchema, UpdateSchema
+from models import Addon
+
+
+BATCH_SIZE = 50000
+CHUNK_SIZE = 10000
+
+EXTRACTORS: dict[str, type['Extractor']] = {}
+
+
+def register(name: str):
+    def decorator(cls):
+        cls.name = name
+        EXTRACTORS[name] = cls
+        return cls
+
+    return decorator
+
+
+def create_extractors(names: list[str]) -> list['Extractor']:
+    unknown = set(names) - EXTRACTORS.keys()
+    if unknown:
+        raise ValueError(f'Unknown extractors: {sorted(unknown)}, available: {list(EXTRACTORS)}')
+
+    # registration order is write order
+    return [cls() for name, cls in EXTRACTORS.items() if name in names]
+
+
+class Extractor(ABC):
+    name: str
+    schema = None
+    references_addon = True
+    # rendered payload kinds that include this table, dropped after a backfill
+    payloads: tuple[str, ...] = ()
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self.rows = []
+
+    @property
+    def full(self) -> bool:
+        return len(self.rows) >= self.batch_size
+
+    @abstractmethod
+    def extract(self, addons: list[Addon], timestamp: datetime) -> list[dict]:
+        ...
+
+    def add(self, addons: list[Addon], timestamp: datetime):
+        self.rows.extend(self.extract(addons, timestamp))
+
+    def statement(self, rows: list[dict]):
+        return insert(self.schema).values(rows).on_conflict_do_nothing()
+
+    def flush(self, session: Session) -> int:
+        rows, self.rows = self.rows, []
+
+        if self.references_addon and rows:
+            known = set(session.scalars(select(AddonSchema.esoui_id)))
+            rows = [row for row in rows if row['esoui_id'] in known]
+
+        for offset in range(0, len(rows), CHUNK_SIZE):
+            session.execute(self.statement(rows[offset:offset + CHUNK_SIZE]))
+
+        return len(rows)
+
+
+@register('addons')
+class AddonsExtractor(Extractor):
+    """Latest title, author, category and url of every addon seen in the archive."""
+
+    schema = AddonSchema
+    references_addon = False
+    # titles and authors
+    payloads = ('addon', 'author')
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        super().__init__(batch_size)
+        self.latest = {}
+
+    @property
+    def full(self):
+        return len(self.latest) >= self.batch_size
+
+    def extract(self, addons, timestamp):
+        return [
+            {'esoui_id': addon.id, 'title': addon.title, 'author': addon.author, 'category': addon.categoryId, 'url': addon.fileInfoUri}
+            for addon in addons
+        ]
+
+    def add(self, addons, timestamp):
+        # files are replayed oldest first, so later snapshots win
+        self.latest.update((row['esoui_id'], row) for row in self.extract(addons, timestamp))
+
+    def statement(self, rows):
+        statement = insert(AddonSchema).values(rows)
+        return statement.on_conflict_do_update(
+            index_elements=[AddonSchema.esoui_id],
+            set_={column: statement.excluded[column] for column in ('title', 'author', 'category', 'url')},
+        )
+
+    def flush(self, session):
+        rows, self.latest = list(self.latest.values()), {}
+
+        for offset in range(0, len(rows), CHUNK_SIZE):
+            session.execute(self.statement(rows[offset:offset + CHUNK_SIZE]))
+
+        return len(rows)
+
+
+@register('downloads')
+class DownloadsExtractor(Extractor):
+    schema = DownloadsSchema
+    payloads = ('addon', 'speed', 'author')
+
+    def extract(self, addons, timestamp):
+        return [{'esoui_id': addon.id, 'timestamp': timestamp, 'downloads': addon.downloads} for addon in addons]
+
+
+@register('updates')
+class UpdatesExtractor(Extractor):
+    """One row per release; every snapshot repeats the latest one of each addon."""
+
+    schema = UpdateSchema
+    references_addon = False
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        super().__init__(batch_size)
+        self.seen = set()
+
+    def extract(self, addons, timestamp):
+        rows = []
+        for addon in addons:
+            if (addon.id, addon.lastUpdate) not in self.seen:
+                self.seen.add((addon.id, addon.lastUpdate))
+                rows.append({'esoui_id': addon.id, 'timestamp': addon.lastUpdate, 'version': addon.version, 'checksum': addon.checksum})
+
+        return rows
+
+
+class ChangedValuesExtractor(Extractor):
+    """Keeps a row only when the value differs from the previous snapshot of the same pass."""
+
+    column: str
+    field: str
+    payloads = ('metrics',)
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        super().__init__(batch_size)
+        self.previous = {}
+
+    def extract(self, addons, timestamp):
+        rows = []
+        for addon in addons:
+            value = getattr(addon, self.field)
+            if self.previous.get(addon.id) != value:
+                self.previous[addon.id] = value
+                rows.append({'esoui_id': addon.id, 'timestamp': timestamp, self.column: value})
+
+        return rows
+
+
+@register('favorites')
+class FavoritesExtractor(ChangedValuesExtractor):
+    schema = FavoritesSchema
+    column = 'favorites'
+    field = 'favorites'
+
+
+@register('downloads_monthly')
+class MonthlyDownloadsExtractor(ChangedValuesExtractor):
+    schema = MonthlyDownloadsSchema
+    column = 'downloads_monthly'
+    field = 'downloadsMonthly'
@@ -0,0 +1,108 @@
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+import logging
+import time
+
+from prefect.runtime import flow_run
+from prometheus_client import CollectorRegistry, Gauge, write_to_textfile
+
+from core.metrics import METRICS_PATH
+
+
+logger = logging.getLogger(__name__)
+
+# heap tuple header and line pointer, indexes are not counted
+ROW_OVERHEAD = 28
+
+
+REGISTRY = CollectorRegistry()
+
+LABELS = ['flow', 'task']
+
+TASK_CALLS = Gauge('pipeline_task_calls', 'Task calls in the last flow run', LABELS + ['status'], registry=REGISTRY)
+TASK_DURATION = Gauge('pipeline_task_duration_seconds', 'Time spent in a task during the last flow run', LABELS, registry=REGISTRY)
+TASK_ROWS = Gauge('pipeline_task_rows', 'Rows handled by a task during the last flow run', LABELS + ['kind'], registry=REGISTRY)
+TASK_BYTES = Gauge('pipeline_task_bytes', 'Bytes handled by a task during the last flow run', LABELS + ['kind'], registry=REGISTRY)
+FLOW_LAST_RUN = Gauge('pipeline_flow_last_run_timestamp_seconds', 'When a flow last reported metrics', ['flow'], registry=REGISTRY)
+
+_current_task: ContextVar[str] = ContextVar('current_task', default='unknown')
+_current_run = None
+
+
+def _flow_name() -> str:
+    return flow_run.flow_name or 'unknown'
+
+
+def _start_run(run_id=None):
+    # runs of a served flow may share a process, but metrics describe one run
+    global _current_run
+
+    run_id = run_id or flow_run.id
+    if run_id != _current_run:
+        _current_run = run_id
+        for metric in (TASK_CALLS, TASK_DURATION, TASK_ROWS, TASK_BYTES):
+            metric.clear()
+
+
+def write_metrics(flow, run, state):
+    """Flow hook writing the run's metrics to `METRICS_PATH/<flow>.prom`.
+
+    Runs once per flow run, on completion and on failure; a metrics problem is
+    logged and never fails the run.
+    """
+    try:
+        _start_run(str(run.id))
+        FLOW_LAST_RUN.labels(flow=flow.name).set_to_current_time()
+
+        METRICS_PATH.mkdir(parents=True, exist_ok=True)
+        write_to_textfile(str(METRICS_PATH / f'{flow.name}.prom'), REGISTRY)
+    except Exception:
+        logger.exception(f'Failed to write metrics of {flow.name}')
+
+
+def instrumented(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        _start_run()
+        token = _current_task.set(fn.__name__)
+        start = time.perf_counter()
+        status = 'failed'
+
+        try:
+            result = fn(*args, **kwargs)
+            status = 'completed'
+            return result
+        finally:
+            labels = {'flow': _flow_name(), 'task': fn.__name__}
+            TASK_DURATION.labels(**labels).inc(time.perf_counter() - start)
+            TASK_CALLS.labels(**labels, status=status).inc()
+            _current_task.reset(token)
+
+    return wrapper
+
+
+def observe(rows: dict[str, int] | None = None, size: dict[str, int] | None = None):
+    labels = {'flow': _flow_name(), 'task': _current_task.get()}
+
+    for kind, value in (rows or {}).items():
+        TASK_ROWS.labels(**labels, kind=kind).inc(value or 0)
+
+    for kind, value in (size or {}).items():
+        TASK_BYTES.labels(**labels, kind=kind).inc(value or 0)
+
+
+def _value_size(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode()) + 1
+    if isinstance(value, (datetime, float)):
+        return 8
+
+    return 4
+
+
+def estimate_size(rows: list[dict]) -> int:
+    """Approximate bytes the rows take in their table, without asking the database."""
+    return sum(ROW_OVERHEAD + sum(_value_size(value) for value in row.values()) for row in rows)
@@ -13,6 +13,7 @@ from fake_useragent import UserAgent
 import requests
 
 from prefect import flow, serve, task, get_run_logger
+from prefect.cache_policies import NO_CACHE
 from prefect.runtime import flow_run
 from prefect.schedules import Interval
 
@@ -20,13 +21,22 @@ import pandas as pd
 
 from pydantic import ValidationError
 
+from core.charts import ChartsService, Filters
 from core.database import create_tables, get_db_cm
-from core.schemas import AddonSchema, DownloadsSchema, UpdateSchema
+from core.payloads import PAYLOAD_MAX_AGE, clear_payloads, payload_age, write_payload
+from core.queries import per_addon
+from core.schemas import AddonSchema, DownloadsSchema, FavoritesSchema, MonthlyDownloadsSchema, UpdateSchema
+from extractors import Extractor, create_extractors
+from instrumentation import estimate_size, instrumented, observe, write_metrics
 from models import Addon
+import archive
 
 
 API_URL = 'https://api.mmoui.com/v4/game/ESO/filelist.json'
 
+# what `extract_data_from_archive` replays when no extractors are given
+DEFAULT_EXTRACTORS = ['updates']
+
 
 FAKE_HEADERS = {
     'User-Agent': UserAgent(platforms='desktop').chrome,
@@ -39,19 +49,25 @@ FAKE_HEADERS = {
 
 
 @task
+@instrumented
 def initialize_database():
     create_tables()
 
 
 @task
+@instrumented
 def get_addons_list():
     response = requests.get(API_URL, headers=FAKE_HEADERS)
     response.raise_for_status()
 
-    return response.json()
+    data = response.json()
+    observe(rows={'fetched': len(data)}, size={'fetched': len(response.content)})
+
+    return data
 
 
 @task
+@instrumented
 def save_to_file(data):
     flow_id = flow_run.id
     timestamp = flow_run.scheduled_start_time.strftime('%Y%m%d_%H%M%S')
@@ -71,11 +87,13 @@ def save_to_file(data):
 
     parquet_path = output_path / f'snapshot_{timestamp}_{flow_id}.parquet'
     df.to_parquet(parquet_path, index=False)
+    observe(size={'parquet': parquet_path.stat().st_size})
 
     return parquet_path
 
 
 @task
+@instrumented
 def compress_with_xz(input_path: Path):
     try:
         subprocess.run(
@@ -92,10 +110,14 @@ def compress_with_xz(input_path: Path):
         print('❌ xz/tar not installed!')
         raise
 
-    return Path(f'{input_path}.xz')
+    output_path = Path(f'{input_path}.xz')
+    observe(size={'archived': output_path.stat().st_size})
+
+    return output_path
 
 
 @task
+@instrumented
 def decompress_with_xz(compressed_path: Path, output_dir: Path) -> Path:
     temp_compressed_path = output_dir / compressed_path.name
     shutil.copy2(compressed_path, temp_compressed_path)
@@ -111,10 +133,13 @@ def decompress_with_xz(compressed_path: Path, output_dir: Path) -> Path:
     if not output_path.exists():
         raise Exception('Decompressed file was not created!')
 
+    observe(size={'archived': compressed_path.stat().st_size, 'decompressed': output_path.stat().st_size})
+
     return output_path
 
 
 @task
+@instrumented
 def extract_downloads(addons: list[Addon]):
     timestamp = flow_run.scheduled_start_time
 
@@ -131,8 +156,56 @@ def extract_downloads(addons: list[Addon]):
         session.execute(insert_downloads)
         session.commit()
 
+    observe(rows={'inserted': len(insert_data)}, size={'inserted': estimate_size(insert_data)})
+
+
+def latest_values(schema, column: str):
+    return select(AddonSchema.esoui_id, per_addon(getattr(schema, column)))
+
+
+def insert_changed_values(schema, column: str, values: dict[int, int], timestamp: datetime) -> list[int]:
+    with get_db_cm() as session:
+        previous = dict(session.execute(latest_values(schema, column)).all())
+
+        insert_data = []
+        for esoui_id, value in values.items():
+            if previous.get(esoui_id) != value:
+                insert_data.append({'esoui_id': esoui_id, 'timestamp': timestamp, column: value})
+
+        if len(insert_data) < 1:
+            return []
+
+        result = session.execute(
+            insert(schema).values(insert_data).on_conflict_do_nothing().returning(schema.esoui_id)
+        )
+        inserted = list(result.scalars())
+        session.commit()
+
+    inserted_ids = set(inserted)
+    observe(
+        rows={'inserted': len(inserted)},
+        size={'inserted': estimate_size([row for row in insert_data if row['esoui_id'] in inserted_ids])},
+    )
+
+    return inserted
+
 
 @task
+@instrumented
+def extract_favorites(addons: list[Addon]) -> list[int]:
+    values = {addon.id: addon.favorites for addon in addons}
+    return insert_changed_values(FavoritesSchema, 'favorites', values, flow_run.scheduled_start_time)
+
+
+@task
+@instrumented
+def extract_monthly_downloads(addons: list[Addon]) -> list[int]:
+    values = {addon.id: addon.downloadsMonthly for addon in addons}
+    return insert_changed_values(MonthlyDownloadsSchema, 'downloads_monthly', values, flow_run.scheduled_start_time)
+
+
+@task
+@instrumented
 def validate(addons: list[dict]) -> list[Addon]:
     logger = get_run_logger()
     validated = []
@@ -144,10 +217,13 @@ def validate(addons: list[dict]) -> list[Addon]:
         except ValidationError as ve:
             logger.warning(ve)
 
+    observe(rows={'validated': len(validated), 'rejected': len(addons) - len(validated)})
+
     return validated
 
 
 @task
+@instrumented
 def update_addons_info(addons: list[Addon]):
     get_addon = lambda esoui_id: (
         select(AddonSchema)
@@ -176,8 +252,11 @@ def update_addons_info(addons: list[Addon]):
         
         session.commit()
 
+    observe(rows={'updated': len(addons)})
+
 
 @task
+@instrumented
 def extract_latest_update(addons: list[Addon]):
     insert_data = []
     for addon in addons:
@@ -198,10 +277,79 @@ def extract_latest_update(addons: list[Addon]):
         rows_inserted = len(result.fetchall())
         session.commit()
 
+        observe(rows={'inserted': rows_inserted})
+
         return rows_inserted
 
 
 @task
+@instrumented
+def find_changed_addons(addons: list[Addon]) -> list[Addon]:
+    with get_db_cm() as session:
+        previous = dict(session.execute(latest_values(DownloadsSchema, 'downloads')).all())
+
+    changed = [addon for addon in addons if previous.get(addon.id) != addon.downloads]
+    observe(rows={'changed': len(changed)})
+
+    return changed
+
+
+@task
+@instrumented
+def find_stale_payloads(addons: list[Addon], changed: list[Addon]) -> list[Addon]:
+    changed_ids = {addon.id for addon in changed}
+
+    stale = []
+    for addon in addons:
+        if addon.id in changed_ids:
+            continue
+
+        age = payload_age('addon', addon.id)
+        if age is None or age > PAYLOAD_MAX_AGE:
+            stale.append(addon)
+
+    observe(rows={'stale': len(stale)})
+
+    return stale
+
+
+@task
+@instrumented
+def render_payloads(addons: list[Addon]):
+    bytes_written = 0
+
+    with get_db_cm() as session:
+        charts = ChartsService(session)
+
+        for addon in addons:
+            bytes_written += write_payload('addon', addon.id, charts.get_downloads(Filters(addons=[addon.id])))
+            bytes_written += write_payload('speed', addon.id, charts.get_download_speed(addon.id))
+
+        for author in {addon.author for addon in addons}:
+            bytes_written += write_payload('author', author, charts.get_downloads(Filters(author=author)))
+
+    observe(rows={'rendered': len(addons)}, size={'rendered': bytes_written})
+    get_run_logger().info(f'Rendered payloads for {len(addons)} addons ({bytes_written} bytes)')
+
+
+@task
+@instrumented
+def render_metrics_payloads(addons: list[Addon], changed_ids: list[int]):
+    # metrics only move when a favorites or monthly downloads row is inserted
+    esoui_ids = set(changed_ids) | {addon.id for addon in addons if payload_age('metrics', addon.id) is None}
+    bytes_written = 0
+
+    with get_db_cm() as session:
+        charts = ChartsService(session)
+
+        for esoui_id in esoui_ids:
+            bytes_written += write_payload('metrics', esoui_id, charts.get_metrics(esoui_id))
+
+    observe(rows={'rendered': len(esoui_ids)}, size={'rendered': bytes_written})
+
+
+@task
+@instrumented
 def find_parquet_xz_files():
     output_path = Path(__file__).parent.parent / 'output'
     PATTERN = '*.parquet.xz'
@@ -218,34 +366,64 @@ def find_parquet_xz_files():
 
 
 @task
+@instrumented
 def load_parquet(parquet_path: Path) -> list[dict]:
     df = pd.read_parquet(parquet_path)
     records = df.to_dict(orient='records')
+    observe(rows={'loaded': len(records)})
 
     return records
 
 
 @task
-def process_single_file(compressed_path: Path, temp_dir: Path) -> dict:
+@instrumented
+def process_single_file(compressed_path: Path, temp_dir: Path) -> list[Addon] | None:
     get_run_logger().info(f'Processing {compressed_path}')
 
     try:
         parquet_path = decompress_with_xz(compressed_path, temp_dir)
         addon_records = load_parquet(parquet_path)
-        
+        parquet_path.unlink()
+
         if not addon_records:
             return
-        
-        addons = validate(addon_records)
-        rows_inserted = extract_latest_update(addons)
 
-        return rows_inserted
+        return validate(addon_records)
     except Exception:
         get_run_logger().exception(f'Failed to process {compressed_path}')
 
 
-@flow
-def extract_data_from_archive():
+@task(cache_policy=NO_CACHE)
+@instrumented
+def write_extracted(extractors: list[Extractor]) -> dict[str, int]:
+    written = {}
+
+    with get_db_cm() as session:
+        for extractor in extractors:
+            written[extractor.name] = extractor.flush(session)
+
+        session.commit()
+
+    observe(rows=written)
+
+    return written
+
+
+@task(cache_policy=NO_CACHE)
+@instrumented
+def drop_payloads(extractors: list[Extractor]):
+    kinds = sorted({kind for extractor in extractors for kind in extractor.payloads})
+    if not kinds:
+        return
+
+    removed = clear_payloads(kinds)
+    observe(rows={'removed': removed})
+    get_run_logger().info(f'Removed {removed} {kinds} payloads, they are rendered again by the next snapshots')
+
+
+@flow(on_completion=[write_metrics], on_failure=[write_metrics])
+def extract_data_from_archive(extractors: list[str] | None = None):
+    extractors = create_extractors(extractors or DEFAULT_EXTRACTORS)
     files = find_parquet_xz_files()
 
     if not files:
@@ -253,15 +431,32 @@ def extract_data_from_archive():
 
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_path = Path(temp_dir)
-        
+
         for file_path in files:
             get_run_logger().setLevel(logging.WARNING)
-            rows_inserted = process_single_file(file_path, temp_path)
+            addons = process_single_file(file_path, temp_path)
             get_run_logger().setLevel(logging.INFO)
-            get_run_logger().info(f'{rows_inserted} addons updated (from {file_path.name})')
+
+            if not addons:
+                continue
+
+            timestamp = archive.snapshot_timestamp(file_path).replace(tzinfo=None)
+            for extractor in extractors:
+                extractor.add(addons, timestamp)
+
+            # a full buffer flushes every extractor, so rows never land before their addon
+            if any(extractor.full for extractor in extractors):
+                written = write_extracted(extractors)
+                get_run_logger().info(f'{written} rows written (up to {file_path.name})')
+
+        written = write_extracted(extractors)
+        get_run_logger().info(f'{written} rows written')
+
+    # rendered charts don't include the backfilled rows
+    drop_payloads(extractors)
 
 
-@flow
+@flow(on_completion=[write_metrics], on_failure=[write_metrics])
 def take_esoui_snapshot():
     initialize_database()
 
@@ -271,9 +466,15 @@ def take_esoui_snapshot():
     compress_with_xz(output_file)
 
     validated_data = validate(results)
+    changed_addons = find_changed_addons(validated_data)
+    stale_addons = find_stale_payloads(validated_data, changed_addons)
     update_addons_info(validated_data)
     extract_downloads(validated_data)
     extract_latest_update(validated_data)
+    new_favorites = extract_favorites(validated_data)
+    new_downloads_monthly = extract_monthly_downloads(validated_data)
+    render_payloads(changed_addons + stale_addons)
+    render_metrics_payloads(validated_data, new_favorites + new_downloads_monthly)
 
 
 if __name__ == '__main__':
@@ -4,7 +4,7 @@ import sqlite3
 from prefect import flow, task
 from sqlalchemy.dialects.postgresql import insert
 
-from core.database import create_tables, Session
+from core.database import create_tables, get_db_cm
 from core.schemas import DownloadsSchema
 
 
@@ -24,7 +24,7 @@ def fill_from_sqlite(sqlite_path: str):
 
     cursor.execute('''SELECT * FROM downloads_snapshots ORDER BY snapshot_id''')
     
-    with Session() as session:
+    with get_db_cm() as session:
         while True:
             cursor.execute(
                 '''SELECT * FROM downloads_snapshots 
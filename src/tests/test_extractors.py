@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+from types import SimpleNamespace
+import unittest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'data_pipeline'))
+
+from extractors import (
+    AddonsExtractor, DownloadsExtractor, Extractor, FavoritesExtractor, UpdatesExtractor, create_extractors,
+)
+
+
+START = datetime(2025, 1, 1)
+HALF_HOUR = timedelta(minutes=30)
+
+
+def addon(esoui_id, **fields):
+    defaults = {
+        'title': f'Addon {esoui_id}', 'author': 'author', 'categoryId': 1, 'fileInfoUri': f'url/{esoui_id}',
+        'downloads': 0, 'favorites': 0, 'downloadsMonthly': 0,
+        'lastUpdate': START, 'version': '1.0', 'checksum': 'abc',
+    }
+    return SimpleNamespace(id=esoui_id, **{**defaults, **fields})
+
+
+class FakeSession:
+    """Records executed statements; `known` are the esoui_ids in the addon table."""
+
+    def __init__(self, known=()):
+        self.known = list(known)
+        self.executed = []
+
+    def scalars(self, statement):
+        return iter(self.known)
+
+    def execute(self, statement):
+        self.executed.append(statement.compile().params)
+
+
+class RegistryTest(unittest.TestCase):
+    def test_write_order(self):
+        extractors = create_extractors(['downloads', 'updates', 'addons'])
+
+        self.assertEqual([extractor.name for extractor in extractors], ['addons', 'downloads', 'updates'])
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            create_extractors(['downloads', 'nope'])
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Extractor()
+
+
+class ChangedValuesTest(unittest.TestCase):
+    def test_only_changes_are_kept(self):
+        extractor = FavoritesExtractor()
+        for i, favorites in enumerate([5, 5, 6, 6, 5]):
+            extractor.add([addon(1, favorites=favorites), addon(2, favorites=1)], START + i * HALF_HOUR)
+
+        self.assertEqual(
+            [(row['esoui_id'], row['timestamp'], row['favorites']) for row in extractor.rows],
+            [(1, START, 5), (2, START, 1), (1, START + 2 * HALF_HOUR, 6), (1, START + 4 * HALF_HOUR, 5)],
+        )
+
+    def test_changes_survive_a_flush(self):
+        extractor = FavoritesExtractor()
+        extractor.add([addon(1, favorites=5)], START)
+        extractor.flush(FakeSession(known=[1]))
+        extractor.add([addon(1, favorites=5)], START + HALF_HOUR)
+
+        self.assertEqual(extractor.rows, [])
+
+
+class UpdatesTest(unittest.TestCase):
+    def test_each_release_once(self):
+        extractor = UpdatesExtractor()
+        extractor.add([addon(1), addon(2)], START)
+        extractor.add([addon(1), addon(2, lastUpdate=START + HALF_HOUR, version='1.1')], START + HALF_HOUR)
+        extractor.add([addon(1), addon(2, lastUpdate=START + HALF_HOUR, version='1.1')], START + 2 * HALF_HOUR)
+
+        self.assertEqual(
+            [(row['esoui_id'], row['version']) for row in extractor.rows],
+            [(1, '1.0'), (2, '1.0'), (2, '1.1')],
+        )
+
+
+class AddonsTest(unittest.TestCase):
+    def test_later_snapshots_win(self):
+        extractor = AddonsExtractor(batch_size=2)
+        extractor.add([addon(1, title='Old')], START)
+        self.assertFalse(extractor.full)
+
+        extractor.add([addon(1, title='New'), addon(2)], START + HALF_HOUR)
+        self.assertTrue(extractor.full)
+
+        session = FakeSession()
+        self.assertEqual(extractor.flush(session), 2)
+        self.assertEqual(session.executed[0]['title_m0'], 'New')
+        self.assertFalse(extractor.full)
+
+
+class FlushTest(unittest.TestCase):
+    def test_batches_and_unknown_addons(self):
+        extractor = DownloadsExtractor(batch_size=3)
+        extractor.add([addon(1), addon(2)], START)
+        self.assertFalse(extractor.full)
+
+        extractor.add([addon(1), addon(3)], START + HALF_HOUR)
+        self.assertTrue(extractor.full)
+
+        session = FakeSession(known=[1, 2])
+        self.assertEqual(extractor.flush(session), 3)
+        self.assertEqual(extractor.rows, [])
+        self.assertEqual(len(session.executed), 1)
+
+    def test_nothing_to_write(self):
+        session = FakeSession()
+        self.assertEqual(DownloadsExtractor().flush(session), 0)
+        self.assertEqual(session.executed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
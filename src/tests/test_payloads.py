@@ -0,0 +1,81 @@
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+from core import payloads
+from core.payloads import find_variant, parse_accept_encoding
+
+
+class ParseAcceptEncodingTest(unittest.TestCase):
+    def test_qualities(self):
+        self.assertEqual(
+            parse_accept_encoding('gzip, br;q=0.5, deflate;Q=0, *;q=bad'),
+            {'gzip': 1.0, 'br': 0.5, 'deflate': 0.0, '*': 0.0},
+        )
+
+    def test_empty(self):
+        self.assertEqual(parse_accept_encoding(''), {})
+
+
+class FindVariantTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / 'payload.json'
+        for name in ('payload.json', 'payload.json.gz', 'payload.json.br'):
+            (Path(self.directory.name) / name).write_bytes(b'{}')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def variant(self, accept_encoding):
+        path, encoding = find_variant(self.path, accept_encoding)
+        return path.name, encoding
+
+    def test_prefers_brotli(self):
+        self.assertEqual(self.variant('gzip, br'), ('payload.json.br', 'br'))
+
+    def test_zero_quality_is_refused(self):
+        self.assertEqual(self.variant('gzip, br;q=0'), ('payload.json.gz', 'gzip'))
+        self.assertEqual(self.variant('br;q=0, gzip;q=0.0'), ('payload.json', None))
+
+    def test_wildcard(self):
+        self.assertEqual(self.variant('*'), ('payload.json.br', 'br'))
+        self.assertEqual(self.variant('br;q=0, *'), ('payload.json.gz', 'gzip'))
+        self.assertEqual(self.variant('identity, *;q=0'), ('payload.json', None))
+
+    def test_missing_variant(self):
+        (Path(self.directory.name) / 'payload.json.br').unlink()
+        self.assertEqual(self.variant('br'), ('payload.json', None))
+
+
+class PayloadPathTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(payloads, 'PAYLOADS_PATH', Path(self.directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+
+    def test_short_keys_are_readable(self):
+        self.assertEqual(payloads.payload_path('author', 'a b/c').name, 'a%20b%2Fc.json')
+
+    def test_long_keys_are_hashed(self):
+        author = '作者' * 50
+        path = payloads.payload_path('author', author)
+
+        self.assertLess(len(path.name.encode()), 255)
+        self.assertNotEqual(path, payloads.payload_path('author', author + '!'))
+
+        payloads.write_payload('author', author, {'x': 1})
+        self.assertEqual(payloads.read_payload('author', author), {'x': 1})
+        self.assertIsNotNone(payloads.find_payload('author', author))
+
+    def test_missing_payloads(self):
+        self.assertIsNone(payloads.read_payload('author', 'x' * 300))
+        self.assertIsNone(payloads.find_payload('author', 'x' * 300))
+        self.assertIsNone(payloads.payload_age('author', 'x' * 300))
+
+
+if __name__ == '__main__':
+    unittest.main()
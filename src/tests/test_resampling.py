@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta, timezone
+import unittest
+
+import numpy as np
+
+from core import resampling
+
+
+START = datetime(2025, 1, 1)
+HALF_HOUR = timedelta(minutes=30)
+
+
+def snapshots(values, start=START, step=HALF_HOUR, skip=()):
+    """Timestamps every `step`, leaving out the indexes in `skip`."""
+    timestamps, kept = [], []
+    for i, value in enumerate(values):
+        if i not in skip:
+            timestamps.append(start + i * step)
+            kept.append(value)
+
+    return timestamps, kept
+
+
+class ResampleTest(unittest.TestCase):
+    def test_empty(self):
+        series = resampling.resample([], [], '30m')
+
+        self.assertEqual(len(series.x), 0)
+        self.assertEqual(len(series.y), 0)
+        self.assertEqual(len(series.gap), 0)
+
+    def test_single_point(self):
+        series = resampling.resample([START], [10], '30m')
+
+        np.testing.assert_array_equal(series.x, np.array([START], dtype='datetime64[ns]'))
+        np.testing.assert_array_equal(series.y, [10.0])
+        np.testing.assert_array_equal(series.gap, [False])
+
+    def test_single_point_off_grid(self):
+        series = resampling.resample([START + timedelta(minutes=10)], [10], '30m')
+
+        self.assertEqual(len(series.x), 0)
+
+    def test_interpolates_onto_grid(self):
+        timestamps = [START + timedelta(minutes=10), START + timedelta(minutes=70)]
+        series = resampling.resample(timestamps, [0, 60], '30m')
+
+        np.testing.assert_array_equal(
+            series.x,
+            np.array([START + timedelta(minutes=30), START + timedelta(minutes=60)], dtype='datetime64[ns]'),
+        )
+        np.testing.assert_allclose(series.y, [20, 50])
+        np.testing.assert_array_equal(series.gap, [False, False])
+
+    def test_unsorted_input(self):
+        timestamps, values = snapshots([0, 10, 20])
+        series = resampling.resample(timestamps[::-1], values[::-1], '30m')
+
+        np.testing.assert_allclose(series.y, [0, 10, 20])
+
+    def test_timezone_aware_input_is_utc(self):
+        aware = [START.replace(tzinfo=timezone(timedelta(hours=3))) + i * HALF_HOUR for i in range(2)]
+        series = resampling.resample(aware, [0, 10], '30m')
+
+        self.assertEqual(series.x[0], np.datetime64(START - timedelta(hours=3), 'ns'))
+
+    def test_short_hole_is_not_a_gap(self):
+        # one missed run leaves 1h between observations, under MAX_GAP
+        series = resampling.resample(*snapshots([0, 10, 20, 30], skip={1}), '30m')
+
+        np.testing.assert_allclose(series.y, [0, 10, 20, 30])
+        np.testing.assert_array_equal(series.gap, [False, False, False, False])
+
+    def test_long_hole_is_flagged(self):
+        # 3h between the 2nd and 3rd observation
+        timestamps, values = snapshots(range(0, 80, 10), skip={2, 3, 4, 5, 6})
+        series = resampling.resample(timestamps, values, '30m')
+
+        np.testing.assert_array_equal(series.gap, [False, False, True, True, True, True, True, False])
+        # values inside the hole are still interpolated
+        np.testing.assert_allclose(series.y, range(0, 80, 10))
+
+    def test_observations_inside_a_hole_are_not_gaps(self):
+        timestamps, values = snapshots(range(0, 80, 10), skip={2, 3, 4, 5, 6})
+        series = resampling.resample(timestamps, values, '30m', max_gap=timedelta(hours=4))
+
+        self.assertFalse(series.gap.any())
+
+    def test_unknown_resolution(self):
+        with self.assertRaises(ValueError):
+            resampling.resample([START], [0], '5m')
+
+
+class AlignTest(unittest.TestCase):
+    def test_common_grid(self):
+        aligned = resampling.align({
+            'a': snapshots([0, 10, 20]),
+            'b': snapshots([5, 15], start=START + HALF_HOUR),
+            'empty': ([], []),
+        }, '30m')
+
+        self.assertEqual(aligned.keys, ['a', 'b', 'empty'])
+        self.assertEqual(aligned.y.shape, (3, 3))
+        np.testing.assert_array_equal(aligned.gap[1], [True, False, False])
+        self.assertTrue(np.isnan(aligned.y[1, 0]))
+        self.assertTrue(aligned.gap[2].all())
+
+    def test_nothing_to_align(self):
+        aligned = resampling.align({'a': ([], [])}, '1h')
+
+        self.assertEqual(aligned.y.shape, (1, 0))
+
+
+class RateTest(unittest.TestCase):
+    def test_per_hour(self):
+        series = resampling.resample(*snapshots([0, 10, 30]), '30m')
+        speed = resampling.rate(series)
+
+        np.testing.assert_array_equal(speed.x, series.x[1:])
+        np.testing.assert_allclose(speed.y, [20, 40])
+
+    def test_steps_touching_a_gap_are_nan(self):
+        timestamps, values = snapshots(range(0, 80, 10), skip={2, 3, 4, 5, 6})
+        speed = resampling.rate(resampling.resample(timestamps, values, '30m'))
+
+        np.testing.assert_array_equal(np.isnan(speed.y), [False, True, True, True, True, True, True])
+
+    def test_too_short(self):
+        self.assertEqual(len(resampling.rate(resampling.resample([START], [1], '30m')).y), 0)
+        self.assertEqual(len(resampling.rate(resampling.resample([], [], '30m')).y), 0)
+
+    def test_aligned(self):
+        aligned = resampling.align({'a': snapshots([0, 10, 20]), 'b': snapshots([0, 0, 5])}, '30m')
+        speed = resampling.rate(aligned)
+
+        self.assertEqual(speed.y.shape, (2, 2))
+        np.testing.assert_allclose(speed.y, [[20, 20], [0, 10]])
+
+
+class RollingMeanTest(unittest.TestCase):
+    def test_window_in_time(self):
+        series = resampling.Series(
+            np.array([START + i * HALF_HOUR for i in range(5)], dtype='datetime64[ns]'),
+            np.array([0, 0, 30, 0, 0], dtype=np.float64),
+            np.zeros(5, dtype=bool),
+        )
+        smoothed = resampling.rolling_mean(series, timedelta(hours=1, minutes=30))
+
+        np.testing.assert_allclose(smoothed.y, [0, 10, 10, 10, 0])
+
+    def test_gaps_stay_masked(self):
+        gap = np.array([False, False, True, False, False])
+        series = resampling.Series(
+            np.array([START + i * HALF_HOUR for i in range(5)], dtype='datetime64[ns]'),
+            np.array([10, 10, np.nan, 10, 10]),
+            gap,
+        )
+        smoothed = resampling.rolling_mean(series, timedelta(hours=1, minutes=30))
+
+        np.testing.assert_array_equal(np.isnan(smoothed.y), gap)
+        np.testing.assert_allclose(smoothed.y[~gap], 10)
+
+    def test_too_short(self):
+        series = resampling.resample([START], [1], '30m')
+
+        self.assertIs(resampling.rolling_mean(series, timedelta(hours=2)), series)
+
+
+class ShareAndRankTest(unittest.TestCase):
+    def test_share_and_rank(self):
+        aligned = resampling.AlignedSeries(
+            np.array([START, START + HALF_HOUR], dtype='datetime64[ns]'),
+            ['a', 'b', 'c'],
+            np.array([[1, 0], [3, 0], [np.nan, 0]]),
+            np.zeros((3, 2), dtype=bool),
+        )
+
+        share = resampling.share(aligned)
+        np.testing.assert_allclose(share[:, 0], [0.25, 0.75, np.nan])
+        # nothing to share in a column that sums to zero
+        self.assertTrue(np.isnan(share[:, 1]).all())
+
+        rank = resampling.rank(aligned)
+        np.testing.assert_array_equal(rank[:, 0], [2, 1, np.nan])
+        np.testing.assert_array_equal(rank[:, 1], [1, 2, 3])
+
+
+class ToPlotTest(unittest.TestCase):
+    def test_masked_points_are_none(self):
+        series = resampling.Series(
+            np.array([START, START + HALF_HOUR, START + 2 * HALF_HOUR], dtype='datetime64[ns]'),
+            np.array([1.4, 2.0, np.nan]),
+            np.array([False, True, False]),
+        )
+
+        self.assertEqual(resampling.to_plot(series, as_int=True), {
+            'x': [START, START + HALF_HOUR, START + 2 * HALF_HOUR],
+            'y': [1, None, None],
+        })
+        self.assertEqual(resampling.to_plot(series, mask_gaps=False)['y'], [1.4, 2.0, None])
+
+    def test_rounding(self):
+        values = np.array([0.0007843393220714123, np.nan, 12.3456])
+
+        self.assertEqual(resampling.to_list(values, decimals=4), [0.0008, None, 12.3456])
+        self.assertEqual(resampling.to_list(values, decimals=2), [0.0, None, 12.35])
+
+
+if __name__ == '__main__':
+    unittest.main()